@@ -16,7 +16,7 @@ import collections
 import itertools
 from util.io import formatting
 
-from . import base, simpleimagebuilder
+from . import base, simpleimagebuilder, worklist, annotationworkers, pointsto
 
 from analysis.storegraph import storegraph, canonicalobjects, extendedtypes
 import analysis.cpasignature
@@ -41,8 +41,14 @@ from analysis.astcollector import getOps
 # For keeping track of how much time we spend decompiling.
 import time
 
+# For sampling constraints
+import random
+import struct
+
 import util.canonical
 
+import config
+
 # For allocation
 import types
 
@@ -65,10 +71,12 @@ def foldFunctionIR(extractor, func, vargs=(), kargs={}):
 ###############################
 
 class InterproceduralDataflow(object):
-	def __init__(self, compiler, graph, opPathLength, clone):
+	def __init__(self, compiler, graph, opPathLength, clone, deltaPropagation=True, worklistName='fifo', collapseCycles=True):
 		self.decompileTime = 0
 		self.console   = compiler.console
 		self.extractor = compiler.extractor
+		self.annotationPool = compiler.annotationPool
+		self.annotationWorkers = compiler.options.get('annotationWorkers', 1)
 		self.clone = clone # Should we copy the code before annotating it?
 
 		# Has the context been constructed?
@@ -77,24 +85,53 @@ class InterproceduralDataflow(object):
 		self.liveCode = set()
 
 		# Constraint information, for debugging
+		# In streaming mode only a bounded random sample is kept for validation.
 		self.constraints = []
+		self.numConstraints = 0
+		self.retainConstraints = compiler.options.get('retainConstraints', True)
+		self.constraintSample  = compiler.options.get('constraintSample', 1000)
+		self.sampler = random.Random(0)
 
 		# The worklist
-		self.dirty = collections.deque()
+		self.dirty = worklist.createWorklist(worklistName, self)
+		self.steps = 0
+
+		# Should constraints only see the types added since they last fired?
+		self.deltaPropagation     = deltaPropagation
+		self.combinationsEvaluated = 0
+		self.combinationsSkipped   = 0
+
+		# Should cycles of copies between locals be merged into a single slot?
+		self.collapseCycles  = collapseCycles
+		self.cycleChecked    = set()
+		self.cyclesCollapsed = 0
+		self.slotsCollapsed  = 0
+
+		# Merge and forward resolution statistics for the store graph.
+		storegraph.mergeStats.reset()
 
 		self.canonical = graph.canonical
-		self._canonicalContext = util.canonical.CanonicalCache(base.AnalysisContext)
+		self._canonicalContext = util.canonical.CanonicalCache(base.AnalysisContext, self.canonical.arena)
+		self._canonicalSignature = util.canonical.CanonicalCache(analysis.cpasignature.CPASignature, self.canonical.arena)
 
 		# Controls how many previous ops are remembered by a context.
 		# TODO remember prior CPA signatures?
 		self.opPathLength = opPathLength
 		self.cache = {}
 
-		# Information for contextual operations.
-		self.opAllocates      = collections.defaultdict(set)
-		self.opReads          = collections.defaultdict(set)
-		self.opModifies       = collections.defaultdict(set)
-		self.opInvokes        = collections.defaultdict(set)
+		# Caps the number of contexts per code object, 0 is unlimited.
+		# Past the cap, shorter op paths and more general signatures are used.
+		self.contextLimit     = compiler.options.get('contextLimit', 0)
+		self.pathsShortened   = 0
+		self.contextsMerged   = 0
+		self.contextsWidened  = 0
+
+		# Information for contextual operations, keyed by op context.
+		indexed = getattr(config, 'indexedTables', False)
+		self.opAllocates      = util.canonical.canonicalTable(set, indexed)
+		self.opReads          = util.canonical.canonicalTable(set, indexed)
+		self.opModifies       = util.canonical.canonicalTable(set, indexed)
+		self.opInvokes        = util.canonical.canonicalTable(set, indexed)
 
 		self.codeContexts     = collections.defaultdict(set)
 
@@ -138,9 +175,44 @@ class InterproceduralDataflow(object):
 		elif self.opPathLength == 1:
 			path = op
 		else:
-			path = original[1:]+(op,)
+			# The original path may have been shortened by the context limit.
+			if original is None: original = ()
+			path = (original+(op,))[-self.opPathLength:]
 
 		return self.cache.setdefault(path, path)
+
+	def shorterOpPaths(self, path):
+		if self.opPathLength > 1 and path is not None:
+			for length in range(len(path)-1, 0, -1):
+				shorter = path[-length:]
+				yield self.cache.setdefault(shorter, shorter)
+		yield None
+
+	def generalSignature(self, sig):
+		params = [analysis.cpasignature.Any if isinstance(param, extendedtypes.ExtendedType) else param for param in sig.params]
+		return self._signature(sig.code, sig.selfparam, params)
+
+	def budgetContext(self, code, sig, opPath):
+		contexts = self.codeContexts[code]
+
+		# Forget the oldest ops in the path.
+		for shorter in self.shorterOpPaths(opPath):
+			context = self._canonicalContext(sig, shorter, self.storeGraph)
+			if context in contexts:
+				self.pathsShortened += 1
+				return context
+
+		# Reuse a context that is more general than this one.
+		for context in contexts:
+			other = context.signature
+			if other.selfparam is sig.selfparam and other.subsumes(sig):
+				self.contextsMerged += 1
+				return context
+
+		# Make the parameters megamorphic.
+		self.contextsWidened += 1
+		return self._canonicalContext(self.generalSignature(sig), None, self.storeGraph)
+
 	def ensureLoaded(self, obj):
 		# TODO the timing is no longer guaranteed, as the store graph bypasses this...
 		start = time.clock()
@@ -155,21 +227,34 @@ class InterproceduralDataflow(object):
 
 	def logAllocation(self, cop, cobj):
 		assert isinstance(cobj, storegraph.ObjectNode), type(cobj)
-		self.opAllocates[(cop.code, cop.op, cop.context)].add(cobj)
+		self.opAllocates[cop].add(cobj)
 
 
 	def logRead(self, cop, slot):
 		assert isinstance(slot, storegraph.SlotNode), type(slot)
-		self.opReads[(cop.code, cop.op, cop.context)].add(slot)
+		self.opReads[cop].add(slot)
 
 
 	def logModify(self, cop, slot):
 		assert isinstance(slot, storegraph.SlotNode), type(slot)
-		self.opModifies[(cop.code, cop.op, cop.context)].add(slot)
+		self.opModifies[cop].add(slot)
 
 
 	def constraint(self, constraint):
-		self.constraints.append(constraint)
+		self.numConstraints += 1
+
+		if self.retainConstraints or len(self.constraints) < self.constraintSample:
+			self.constraints.append(constraint)
+		else:
+			# Reservoir sampling
+			index = self.sampler.randint(0, self.numConstraints-1)
+			if index < self.constraintSample:
+				self.constraints[index] = constraint
+
+	def constraintMemorySaved(self):
+		# The size of the list that would have held every constraint.
+		pointer = struct.calcsize('P')
+		return (self.numConstraints-len(self.constraints))*pointer
 
 	def _signature(self, code, selfparam, params):
 		def checkParam(param):
@@ -180,7 +265,7 @@ class InterproceduralDataflow(object):
 		for param in params:
 			assert checkParam(param), param
 
-		return analysis.cpasignature.CPASignature(code, selfparam, params)
+		return self._canonicalSignature(code, selfparam, tuple(params))
 
 	def canonicalContext(self, srcOp, code, selfparam, params):
 		assert isinstance(srcOp, canonicalobjects.OpContext), type(srcOp)
@@ -195,6 +280,11 @@ class InterproceduralDataflow(object):
 
 		context = self._canonicalContext(sig, opPath, self.storeGraph)
 
+		if self.contextLimit:
+			contexts = self.codeContexts[code]
+			if context not in contexts and len(contexts) >= self.contextLimit:
+				context = self.budgetContext(code, sig, opPath)
+
 		# Mark that we created the context.
 		self.codeContexts[code].add(context)
 
@@ -222,13 +312,75 @@ class InterproceduralDataflow(object):
 		return self.canonical.pathType(context.opPath, instObj, op)
 
 	def process(self):
-		while self.dirty:
-			current = self.dirty.popleft()
+		dirty = self.dirty
+		while dirty:
+			current = dirty.pop()
+			dirty.fired(current)
 			current.process()
+			self.steps += 1
 
 	def createAssign(self, source, dest):
 		AssignmentConstraint(self, source, dest)
 
+	### Cycle collapsing ###
+
+	def copySuccessors(self, slot):
+		for observer in slot.observers:
+			if isinstance(observer, AssignmentConstraint) and observer.sourceslot.getForward() is slot:
+				dst = observer.destslot.getForward()
+				if dst is not slot:
+					yield dst
+
+	def collapsible(self, slot, region):
+		# Only root slots are merged, field slots belong to their object.
+		return slot.object is None and slot.region.getForward() is region
+
+	def findCopyPath(self, start, target):
+		region = start.region.getForward()
+		parent = {start:None}
+		stack  = [start]
+
+		while stack:
+			slot = stack.pop()
+			for succ in self.copySuccessors(slot):
+				if succ in parent or not self.collapsible(succ, region):
+					continue
+
+				parent[succ] = slot
+
+				if succ is target:
+					path = []
+					while succ is not None:
+						path.append(succ)
+						succ = parent[succ]
+					return path
+
+				stack.append(succ)
+
+		return None
+
+	def checkCycle(self, constraint):
+		# Lazy cycle detection, each copy is only checked once.
+		if constraint in self.cycleChecked: return
+		self.cycleChecked.add(constraint)
+
+		src = constraint.sourceslot
+		dst = constraint.destslot
+		region = dst.region.getForward()
+
+		if src is dst or not self.collapsible(src, region) or not self.collapsible(dst, region):
+			return
+
+		cycle = self.findCopyPath(dst, src)
+
+		if cycle:
+			slot = cycle[0]
+			for other in cycle[1:]:
+				slot = slot.merge(other)
+
+			self.cyclesCollapsed += 1
+			self.slotsCollapsed  += len(cycle)-1
+
 	def fold(self, targetcontext):
 		def notConst(obj):
 			return obj is analysis.cpasignature.Any or (obj is not None and not obj.obj.isConstant())
@@ -354,44 +506,72 @@ class InterproceduralDataflow(object):
 
 	### Annotation methods ###
 
-	def collectContexts(self, lut, contexts):
-		cdata  = [annotations.annotationSet(lut[context]) for context in contexts]
-		data = annotations.makeContextualAnnotation(cdata)
+	def contextData(self, lut, contexts):
+		return [annotations.annotationSet(lut[context]) for context in contexts]
 
-		data = self.annotationCache.setdefault(data, data)
-		self.annotationCount += 1
+	def rmaData(self, code, contexts, op):
+		cops = [self.canonical.opContext(code, op, context) for context in contexts]
 
-		return data
+		creads     = [annotations.annotationSet(self.opReads.get(cop, ())) for cop in cops]
+		cmodifies  = [annotations.annotationSet(self.opModifies.get(cop, ())) for cop in cops]
+		callocates = [annotations.annotationSet(self.opAllocates.get(cop, ())) for cop in cops]
 
-	def collectRMA(self, code, contexts, op):
-		creads     = [annotations.annotationSet(self.opReads[(code, op, context)]) for context in contexts]
-		reads     = annotations.makeContextualAnnotation(creads)
+		return creads, cmodifies, callocates
 
-		cmodifies  = [annotations.annotationSet(self.opModifies[(code, op, context)]) for context in contexts]
-		modifies  = annotations.makeContextualAnnotation(cmodifies)
+	def collectCodeData(self, code, contexts):
+		# Only reads the solver tables, so it is safe to run in a worker.
+		ops, lcls = getOps(code)
 
-		callocates = [annotations.annotationSet(self.opAllocates[(code, op, context)]) for context in contexts]
-		allocates = annotations.makeContextualAnnotation(callocates)
+		# Creating vparam and kparam objects produces side effects...
+		# Store them in the code annotation
+		codeRMA = self.rmaData(code, contexts, None)
 
-		reads     = self.annotationCache.setdefault(reads, reads)
-		modifies  = self.annotationCache.setdefault(modifies, modifies)
-		allocates = self.annotationCache.setdefault(allocates, allocates)
-		self.annotationCount += 3
+		opData = []
+		for op in ops:
+			invokes = self.contextData(self.invokeLUT[(code, op)], contexts)
+			opData.append((invokes,)+self.rmaData(code, contexts, op))
 
-		return reads, modifies, allocates
+		lclData = []
+		for lcl in lcls:
+			if isinstance(lcl, ast.Existing):
+				contextLclLUT = self.lclLUT[(code, lcl.object)]
+			else:
+				contextLclLUT = self.lclLUT[(code, lcl)]
+			lclData.append(self.contextData(contextLclLUT, contexts))
 
-	def annotateCode(self, code, contexts, cloner):
+		return codeRMA, opData, lclData
+
+	def annotateCodeData(self, code, contexts, data, cloner):
 		newcode = cloner.code(code)
+		pool = self.annotationPool
+		codeRMA, opData, lclData = data
 
-		contexts = tuple(contexts)
 		newcode.rewriteAnnotation(contexts=contexts)
 
-		# Creating vparam and kparam objects produces side effects...
-		# Store them in the code annotation
-		reads, modifies, allocates = self.collectRMA(code, contexts, None)
+		reads, modifies, allocates = [pool.contextual(cdata, newcode) for cdata in codeRMA]
 		newcode.rewriteAnnotation(codeReads=reads, codeModifies=modifies, codeAllocates=allocates)
 
-		return contexts
+		ops, lcls = getOps(code)
+
+		for op, cdata in zip(ops, opData):
+			invokes, reads, modifies, allocates = [pool.contextual(part, newcode) for part in cdata]
+
+			newop = cloner.op(op)
+
+			newop.rewriteAnnotation(
+				invokes=invokes,
+				opReads=reads,
+				opModifies=modifies,
+				opAllocates=allocates,
+				)
+
+		for lcl, cdata in zip(lcls, lclData):
+			if isinstance(lcl, ast.Existing):
+				newlcl = cloner.op(lcl) # HACK?
+			else:
+				newlcl = cloner.lcl(lcl)
+
+			newlcl.rewriteAnnotation(references=pool.contextual(cdata, newcode))
 
 	def mergeAbstractCode(self, code, cloner):
 		newcode = cloner.code(code)
@@ -401,10 +581,10 @@ class InterproceduralDataflow(object):
 		modifies  = annotations.mergeContextualAnnotation(newcode.annotation.codeModifies, newcode.abstractModifies())
 		allocates = annotations.mergeContextualAnnotation(newcode.annotation.codeAllocates, newcode.abstractAllocates())
 
-		reads     = self.annotationCache.setdefault(reads, reads)
-		modifies  = self.annotationCache.setdefault(modifies, modifies)
-		allocates = self.annotationCache.setdefault(allocates, allocates)
-		self.annotationCount += 3
+		pool = self.annotationPool
+		reads     = pool.intern(reads, newcode)
+		modifies  = pool.intern(modifies, newcode)
+		allocates = pool.intern(allocates, newcode)
 
 		newcode.rewriteAnnotation(codeReads=reads, codeModifies=modifies, codeAllocates=allocates)
 
@@ -436,33 +616,9 @@ class InterproceduralDataflow(object):
 				lclLUT[(name.code, name.object)][name.context] = slot
 		self.lclLUT = lclLUT
 
-	def annotateOps(self, code, contexts, ops, cloner):
-		for op in ops:
-			invokes = self.collectContexts(self.invokeLUT[(code, op)], contexts)
-			reads, modifies, allocates = self.collectRMA(code, contexts, op)
-
-			newop = cloner.op(op)
-
-			newop.rewriteAnnotation(
-				invokes=invokes,
-				opReads=reads,
-				opModifies=modifies,
-				opAllocates=allocates,
-				)
-
-	def annotateLocals(self, code, contexts, lcls, cloner):
-		for lcl in lcls:
-			if isinstance(lcl, ast.Existing):
-				contextLclLUT = self.lclLUT[(code, lcl.object)]
-				newlcl = cloner.op(lcl) # HACK?
-			else:
-				contextLclLUT = self.lclLUT[(code, lcl)]
-				newlcl = cloner.lcl(lcl)
-			references = self.collectContexts(contextLclLUT, contexts)
-
-			newlcl.rewriteAnnotation(references=references)
-
 	def annotate(self):
+		start = time.clock()
+
 		if self.clone:
 			cloner = codecloner.FunctionCloner(self.codeContexts.iterkeys())
 
@@ -471,31 +627,49 @@ class InterproceduralDataflow(object):
 		else:
 			cloner = codecloner.NullCloner(self.codeContexts.iterkeys())
 
-		self.annotationCount = 0
-		self.annotationCache = {}
+		pool = self.annotationPool
+		lookups, hits = pool.lookups, pool.hits
 
 		self.reindexAnnotations(cloner)
 
 		self.annotateEntryPoints(cloner)
 
-		for code, contexts in self.codeContexts.iteritems():
-			if code is self.externalFunction: continue
+		codes = [(code, tuple(contexts)) for code, contexts in self.codeContexts.iteritems() if code is not self.externalFunction]
 
-			cloner.process(code)
+		results = None
+		if self.annotationWorkers > 1 and len(codes) > 1 and annotationworkers.available():
+			collectStart = time.clock()
+			try:
+				results = annotationworkers.collect(self, codes, self.annotationWorkers)
+			except Exception, e:
+				self.console.output("Parallel annotation failed, annotating serially: %s" % e)
+			else:
+				self.console.output("Annotation workers %d - %s collect" % (self.annotationWorkers, formatting.elapsedTime(time.clock()-collectStart)))
 
-			contexts = self.annotateCode(code, contexts, cloner)
+		# Results are applied in the serial order, so the output is identical.
+		for i, (code, contexts) in enumerate(codes):
+			cloner.process(code)
+			# Demand driven queries need to see through the cloning.
+			cloner.recordOrigin(code, self.invokeLUT)
 
-			ops, lcls = getOps(code)
+			data = results[i] if results is not None else None
+			if data is None:
+				data = self.collectCodeData(code, contexts)
 
-			self.annotateOps(code, contexts, ops, cloner)
-			self.annotateLocals(code, contexts, lcls, cloner)
+			self.annotateCodeData(code, contexts, data, cloner)
 
 			self.mergeAbstractCode(code, cloner)
 
-		self.console.output("Annotation compression %f - %d" % (float(len(self.annotationCache))/max(self.annotationCount, 1), self.annotationCount))
+		self.pointsTo = pointsto.PointsToQuery(self.storeGraph, self.lclLUT, self.invokeLUT, cloner.origin)
 
-		del self.annotationCache
-		del self.annotationCount
+		# Annotations for code that did not survive this pass are no longer needed.
+		evicted = pool.evicted
+		pool.collect(self.liveCode)
+
+		lookups, hits = pool.lookups-lookups, pool.hits-hits
+		self.console.output("Annotation hits    %d/%d (%.1f%%)" % (hits, lookups, 100.0*hits/max(lookups, 1)))
+		self.console.output("Annotation pool    %d - %d evicted - %s" % (len(pool), pool.evicted-evicted, formatting.memorySize(pool.memory())))
+		self.console.output("Annotation time    %s" % formatting.elapsedTime(time.clock()-start))
 
 	### Debugging methods ###
 
@@ -520,20 +694,62 @@ class InterproceduralDataflow(object):
 
 	def dumpSolveInfo(self):
 		console = self.console
-		console.output("Constraints:   %d" % len(self.constraints))
+		console.output("Constraints:   %d" % self.numConstraints)
+		if not self.retainConstraints:
+			console.output("Sampled:       %d" % len(self.constraints))
+			console.output("List Saved:    %s" % formatting.memorySize(self.constraintMemorySaved()))
 		console.output("Contexts:      %d" % len(self.liveContexts))
 		console.output("Code:          %d" % len(self.liveCode))
 		console.output("Contexts/Code: %.1f" % (float(len(self.liveContexts))/max(len(self.liveCode), 1)))
+		if self.contextLimit:
+			console.output("Context Limit: %d" % self.contextLimit)
+			console.output("Shortened:     %d" % self.pathsShortened)
+			console.output("Merged:        %d" % self.contextsMerged)
+			console.output("Widened:       %d" % self.contextsWidened)
 		console.output("Slot Memory:   %s" % formatting.memorySize(self.slotMemory()))
+		memo = self.storeGraph.setManager.memo
+		if memo is not None:
+			console.output("Set Memo:      %d hits, %d misses (%.1f%%), %d evicted" % (memo.hits, memo.misses, memo.hitRate()*100.0, memo.evictions))
+		console.output('')
+		if self.deltaPropagation:
+			console.output("Combinations:  %d" % self.combinationsEvaluated)
+			console.output("Skipped:       %d" % self.combinationsSkipped)
+			console.output('')
+		if self.collapseCycles:
+			console.output("Cycles:        %d" % self.cyclesCollapsed)
+			console.output("Collapsed:     %d" % self.slotsCollapsed)
+			console.output('')
+		stats = storegraph.mergeStats
+		console.output("Merges:        %d (%d regions, %d objects, %d slots)" % (stats.merges(), stats.regionMerges, stats.objectMerges, stats.slotMerges))
+		console.output("Merge Swaps:   %d" % stats.swaps)
+		console.output("Forward Depth: %.2f avg, %d max over %d resolves" % (stats.averageDepth(), stats.maxDepth, stats.resolves))
+		console.output("Compressed:    %d" % stats.compressions)
+		console.output('')
+		counts = self.storeGraph.observerCounts()
+		observed = [count for count in counts if count]
+		console.output("Observers:     %d over %d/%d slots" % (sum(observed), len(observed), len(counts)))
+		console.output("Fan-out:       %.2f avg, %d max" % (float(sum(observed))/max(len(observed), 1), max(observed) if observed else 0))
+		console.output("Deduped:       %d" % stats.observersDeduped)
+		console.output('')
+		console.output("Worklist:      %s" % self.dirty.name)
+		console.output("Steps:         %d" % self.steps)
 		console.output('')
 		console.output("Decompile:     %s" % formatting.elapsedTime(self.decompileTime))
 		console.output("Solve:         %s" % formatting.elapsedTime(self.solveTime))
 		console.output('')
 
 
-def evaluateWithImage(compiler, prgm, opPathLength=0, firstPass=True, clone=False):
+def evaluateWithImage(compiler, prgm, opPathLength=0, firstPass=True, clone=False, deltaPropagation=None, worklistName=None, collapseCycles=None):
+	# Unless overridden, the strategy is chosen by the makefile.
+	if deltaPropagation is None:
+		deltaPropagation = compiler.options.get('cpaDeltaPropagation', True)
+	if worklistName is None:
+		worklistName = compiler.options.get('cpaWorklist', 'fifo')
+	if collapseCycles is None:
+		collapseCycles = compiler.options.get('cpaCollapseCycles', True)
+
 	with compiler.console.scope('cpa analysis'):
-		dataflow = InterproceduralDataflow(compiler, prgm.storeGraph, opPathLength, clone)
+		dataflow = InterproceduralDataflow(compiler, prgm.storeGraph, opPathLength, clone, deltaPropagation, worklistName, collapseCycles)
 		dataflow.firstPass = firstPass # HACK for debugging
 
 		for entryPoint, args in prgm.entryPoints:
@@ -548,15 +764,17 @@ def evaluateWithImage(compiler, prgm, opPathLength=0, firstPass=True, clone=Fals
 			# Helps free up memory.
 			with compiler.console.scope('cleanup'):
 				del dataflow.constraints
+				del dataflow.cycleChecked
 				dataflow.storeGraph.removeObservers()
 
 			with compiler.console.scope('annotate'):
 				dataflow.annotate()
 
 			prgm.liveCode   = dataflow.liveCode
+			prgm.pointsTo   = dataflow.pointsTo
 
 		return dataflow
 
-def evaluate(compiler, prgm, opPathLength=0, firstPass=True):
+def evaluate(compiler, prgm, opPathLength=0, firstPass=True, deltaPropagation=None, worklistName=None, collapseCycles=None):
 	simpleimagebuilder.build(compiler, prgm)
-	return evaluateWithImage(compiler, prgm, opPathLength, firstPass)
+	return evaluateWithImage(compiler, prgm, opPathLength, firstPass, deltaPropagation=deltaPropagation, worklistName=worklistName, collapseCycles=collapseCycles)
@@ -0,0 +1,107 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Collects annotation data for code in forked worker processes.
+# The workers inherit the solved dataflow, so nothing but the results need
+# to be pickled.  Results refer to annotation items by id, which is
+# meaningful in the parent as every item is kept alive by the solver tables.
+
+import os
+import multiprocessing
+
+# Set before the pool forks, read by the workers.
+_task = None
+
+# Without fork the workers re-import this module and never see the task.
+def available():
+	return hasattr(os, 'fork')
+
+def _addItems(items, values):
+	for item in values:
+		items[id(item)] = item
+
+def itemTable(dataflow):
+	items = {}
+
+	for lut in dataflow.invokeLUT.itervalues():
+		for invokes in lut.itervalues():
+			_addItems(items, invokes)
+
+	for lut in dataflow.lclLUT.itervalues():
+		for slot in lut.itervalues():
+			_addItems(items, slot)
+
+	for table in (dataflow.opReads, dataflow.opModifies, dataflow.opAllocates):
+		for cop, values in table.iteritems():
+			_addItems(items, values)
+
+	return items
+
+
+def encode(cdata):
+	return tuple([tuple([id(item) for item in data]) for data in cdata])
+
+def decode(items, cdata):
+	return [tuple([items[uid] for uid in data]) for data in cdata]
+
+def encodeCode(data):
+	codeRMA, opData, lclData = data
+	return ([encode(cdata) for cdata in codeRMA],
+		[[encode(cdata) for cdata in op] for op in opData],
+		[encode(cdata) for cdata in lclData])
+
+def decodeCode(items, data):
+	codeRMA, opData, lclData = data
+	return ([decode(items, cdata) for cdata in codeRMA],
+		[[decode(items, cdata) for cdata in op] for op in opData],
+		[decode(items, cdata) for cdata in lclData])
+
+
+def _collectChunk(indices):
+	dataflow, codes = _task
+	return [encodeCode(dataflow.collectCodeData(*codes[i])) for i in indices]
+
+def collect(dataflow, codes, workers):
+	global _task
+	assert available()
+
+	# Interleaved chunks, several per worker to balance the load.
+	chunkCount = max(min(len(codes), workers*4), 1)
+	chunks = [range(i, len(codes), chunkCount) for i in range(chunkCount)]
+
+	# Built before forking, so any item the workers did not create has
+	# the same id in both processes.
+	items = itemTable(dataflow)
+
+	_task = (dataflow, codes)
+	try:
+		pool = multiprocessing.Pool(workers)
+		try:
+			chunkResults = pool.map(_collectChunk, chunks)
+		finally:
+			pool.close()
+			pool.join()
+	finally:
+		_task = None
+
+	results = [None]*len(codes)
+	for indices, chunkResult in zip(chunks, chunkResults):
+		for i, data in zip(indices, chunkResult):
+			try:
+				results[i] = decodeCode(items, data)
+			except KeyError:
+				# The worker created an item the parent does not have,
+				# this code is collected serially instead.
+				results[i] = None
+	return results
@@ -31,6 +31,9 @@ class FunctionCloner(TypeDispatcher):
 	def __init__(self, liveCode):
 		self.codeMap = createCodeMap(liveCode)
 
+		# Maps the clones back to the originals, for demand driven queries.
+		self.origin = dict([(new, old) for old, new in self.codeMap.iteritems()])
+
 	@dispatch(ast.Local)
 	def visitLocal(self, node):
 		if not node in self.localMap:
@@ -73,10 +76,21 @@ class FunctionCloner(TypeDispatcher):
 	def code(self, code):
 		return self.codeMap[code]
 
+	def recordOrigin(self, code, invokeLUT):
+		# Map the clones of the last processed code back to the originals.
+		# Only ops that invoke something can be queried, and those
+		# originals are already kept alive by invokeLUT.
+		origin = self.origin
+		for old, new in self.opMap.iteritems():
+			if (code, old) in invokeLUT:
+				origin[new] = old
+		for old, new in self.localMap.iteritems():
+			origin[new] = old
+
 # Same interface, no cloning performed.
 class NullCloner(object):
 	def __init__(self, liveCode):
-		pass
+		self.origin = None
 
 	def process(self, code):
 		pass
@@ -89,3 +103,6 @@ class NullCloner(object):
 
 	def code(self, code):
 		return code
+
+	def recordOrigin(self, code, invokeLUT):
+		pass
@@ -36,10 +36,10 @@ def slotRefs(slot):
 		# Automatically megamorphic.
 		return (analysis.cpasignature.Any,)
 	else:
-		return slot.refs
+		return slot.getForward().refs
 
 class Constraint(object):
-	__slots__ = 'sys', 'dirty'
+	__slots__ = 'sys', 'dirty', '__weakref__'
 
 	def __init__(self, sys):
 		self.dirty = False
@@ -74,21 +74,65 @@ class Constraint(object):
 			console.output('')
 
 class CachedConstraint(Constraint):
-	__slots__ = 'observing', 'cache'
+	__slots__ = 'observing', 'cache', 'seen'
 	def __init__(self, sys, *args):
 		self.observing = args
 		self.cache = set()
+		self.seen  = [() for slot in args]
 
 		Constraint.__init__(self, sys)
 
 	def update(self):
 		values = [slotRefs(slot) for slot in self.observing]
+		self.updateCombinations(values)
 
+	def incremental(self):
+		return self.sys.deltaPropagation
+
+	def updateCombinations(self, values):
+		if self.incremental():
+			self.deltaUpdate(values)
+		else:
+			self.fullUpdate(values)
+
+	def fullUpdate(self, values):
 		for args in itertools.product(*values):
 			if not args in self.cache:
 				self.cache.add(args)
 			self.concreteUpdate(*args)
 
+		self.seen = values
+
+	def deltaUpdate(self, values):
+		# Semi-naive evaluation: a new combination must contain at least one
+		# type that was not seen last time.  Slots before the changed slot
+		# use the current types, slots after it use the old types, so each
+		# new combination is enumerated exactly once.
+		seen  = self.seen
+		count = 0
+
+		for i, current in enumerate(values):
+			old = seen[i]
+			if current is old: continue
+
+			delta = [value for value in current if value not in old]
+			if not delta: continue
+
+			for args in itertools.product(*(values[:i]+[delta]+seen[i+1:])):
+				count += 1
+				if not args in self.cache:
+					self.cache.add(args)
+					self.concreteUpdate(*args)
+
+		self.seen = values
+
+		total = 1
+		for current in values:
+			total *= len(current)
+
+		self.sys.combinationsEvaluated += count
+		self.sys.combinationsSkipped   += total-count
+
 	def attach(self):
 		self.sys.constraint(self)
 
@@ -123,7 +167,13 @@ class AssignmentConstraint(Constraint):
 		Constraint.__init__(self, sys)
 
 	def update(self):
-		self.destslot = self.destslot.update(self.sourceslot)
+		self.sourceslot = self.sourceslot.getForward()
+		self.destslot   = self.destslot.update(self.sourceslot)
+
+		# Identical sets on either side of a copy hint at a cycle.
+		refs = self.sourceslot.refs
+		if refs and refs is self.destslot.refs and self.sys.collapseCycles:
+			self.sys.checkCycle(self)
 
 	def attach(self):
 		self.sys.constraint(self)
@@ -356,7 +406,7 @@ class SimpleCheckConstraint(Constraint):
 		# Reads no locals.
 		return ()
 
-	def write(self):
+	def writes(self):
 		return (self.target,)
 
 
@@ -399,6 +449,11 @@ class AbstractCallConstraint(CachedConstraint):
 			return (0,)
 
 
+	def incremental(self):
+		# The length of the vargs tuple is read without being observed,
+		# so every combination must be re-examined when vargs are present.
+		return self.vargs is None and CachedConstraint.incremental(self)
+
 	def concreteUpdate(self, expr, vargs, kargs):
 		for vlength in self.getVArgLengths(vargs):
 			key = (expr, vargs, kargs, vlength)
@@ -490,6 +545,7 @@ class SimpleCallConstraint(CachedConstraint):
 	def clearInvocations(self):
 		# TODO eliminate constraints if target invocation is unused?
 		self.cache.clear()
+		self.seen = [() for slot in self.observing]
 		self.sys.opInvokes[self.op].clear()
 
 	def processMegamorphic(self, values):
@@ -515,10 +571,7 @@ class SimpleCallConstraint(CachedConstraint):
 
 		if changed: self.clearInvocations()
 
-		for args in itertools.product(*values):
-			if not args in self.cache:
-				self.cache.add(args)
-			self.concreteUpdate(*args)
+		self.updateCombinations(values)
 
 	def writes(self):
 		if self.caller.returnargs:
@@ -557,7 +610,7 @@ class DeferedSwitchConstraint(Constraint):
 
 	def update(self):
 		if self.tDefered or self.fDefered:
-			for condType in self.cond.refs:
+			for condType in self.cond.getForward().refs:
 				self.updateBranching(self.getBranch(condType))
 
 	def attach(self):
@@ -595,7 +648,7 @@ class DeferedTypeSwitchConstraint(Constraint):
 		Constraint.__init__(self, sys)
 
 	def update(self):
-		for ref in self.cond.refs:
+		for ref in self.cond.getForward().refs:
 			# Only process a given xtype once.
 			if ref in self.cache: continue
 			self.cache.add(ref)
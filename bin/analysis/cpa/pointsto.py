@@ -0,0 +1,88 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Demand driven points-to queries over a solved store graph.
+# Answers are the same sets annotate() attaches to the AST, but are only
+# computed for the locals and ops that are actually asked about.
+
+from language.python import ast
+from language.python import annotations
+
+class PointsToQuery(object):
+	def __init__(self, storeGraph, lclLUT, invokeLUT, origin=None):
+		self.storeGraph = storeGraph
+		self.lclLUT     = lclLUT
+		self.invokeLUT  = invokeLUT
+
+		# Maps cloned code, ops, and locals back to what the solver saw.
+		self.origin     = origin
+
+		self.cache  = {}
+		self.hits   = 0
+		self.misses = 0
+
+	def original(self, node):
+		if self.origin is None:
+			return node
+		else:
+			return self.origin.get(node, node)
+
+	def _lookup(self, key, compute):
+		result = self.cache.get(key)
+		if result is None:
+			result = compute()
+			self.cache[key] = result
+			self.misses += 1
+		else:
+			self.hits += 1
+		return result
+
+	def _collect(self, lut, context):
+		# lut may be a defaultdict, avoid inserting into it.
+		if lut is None:
+			return ()
+		elif context is None:
+			merged = set()
+			for data in lut.itervalues():
+				merged.update(data)
+			return annotations.annotationSet(merged)
+		else:
+			data = lut.get(context)
+			return annotations.annotationSet(data) if data else ()
+
+	def refs(self, code, lcl, context=None):
+		# The objects a local or existing reference may point to.
+		# If no context is given, the result is merged over all contexts.
+		def compute():
+			if isinstance(lcl, ast.Existing):
+				key = (self.original(code), lcl.object)
+			else:
+				key = (self.original(code), self.original(lcl))
+			return self._collect(self.lclLUT.get(key), context)
+
+		return self._lookup(('refs', code, lcl, context), compute)
+
+	def invokes(self, code, op, context=None):
+		# The (code, context) pairs an op may invoke.
+		def compute():
+			key = (self.original(code), self.original(op))
+			return self._collect(self.invokeLUT.get(key), context)
+
+		return self._lookup(('invokes', code, op, context), compute)
+
+	def invalidate(self):
+		self.cache.clear()
+
+	def hitRate(self):
+		return float(self.hits)/max(self.hits+self.misses, 1)
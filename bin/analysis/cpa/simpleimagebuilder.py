@@ -12,9 +12,64 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os.path
+import hashlib
+import cPickle as pickle
+
 from analysis.storegraph import storegraph, canonicalobjects
 from util.python.calling import CallerArgs
 
+from language.python import program
+from language.python.pyobjdesc import Uncacheable, pyObjDesc, descPyObj
+
+def fieldTypes(pt):
+	for t in pt.mro():
+		fieldtypes = getattr(t, '__fieldtypes__', None)
+		if not isinstance(fieldtypes, dict): continue
+
+		for name, types in fieldtypes.iteritems():
+			if isinstance(types, type):
+				types = (types,)
+			yield name, tuple(types)
+
+def fieldTypesSignature(pt):
+	return tuple(sorted([(name, tuple(["%s.%s" % (t.__module__, t.__name__) for t in types])) for name, types in fieldTypes(pt)]))
+
+
+# A replayable record of the operations that built an image.
+# Objects are identified by (existing, obj) keys, so replaying into a fresh
+# store graph does not need to walk the type hierarchy again.
+class ImageSnapshot(object):
+	__slots__ = 'ops', 'entryPoints', 'signatures'
+
+	def __init__(self):
+		self.ops         = []
+		self.entryPoints = []
+
+		# Field declarations of the objects that were walked, used to validate cached images.
+		self.signatures  = {}
+
+	# Entry point arguments are stored as (selfarg, args, vargs, kargs) tuples.
+	def mapArgs(self, args, f):
+		def mapArg(arg):
+			return None if arg is None else [f(key) for key in arg]
+		selfarg, args, vargs, kargs = args
+		return (mapArg(selfarg), [mapArg(arg) for arg in args], mapArg(vargs), mapArg(kargs))
+
+	def argsTuple(self, args):
+		return (args.selfarg, args.args, args.vargs, args.kargs)
+
+	def callerArgs(self, args):
+		selfarg, args, vargs, kargs = args
+		return CallerArgs(selfarg, args, [], vargs, kargs, None)
+
+	def valid(self):
+		for (existing, obj), signature in self.signatures.iteritems():
+			if fieldTypesSignature(obj.pythonType()) != signature:
+				return False
+		return True
+
+
 class ImageBuilder(object):
 	def __init__(self, compiler, prgm):
 		self.compiler = compiler
@@ -23,10 +78,32 @@ class ImageBuilder(object):
 		self.allObjects = set()
 		self.dirtyObjects = set()
 
-		self.canonical  = canonicalobjects.CanonicalObjects()
+		self.canonical  = canonicalobjects.CanonicalObjects(compiler.internArena)
 		self.storeGraph = storegraph.StoreGraph(self.compiler.extractor, self.canonical)
 		self.entryPoints = []
 
+		self.snapshot = ImageSnapshot()
+
+	def objKey(self, obj):
+		self.ensureLoaded(obj)
+		return (not obj.isAbstract(), obj)
+
+	def keyType(self, key):
+		existing, obj = key
+		if existing:
+			return self.canonical.existingType(obj)
+		else:
+			return self.canonical.externalType(obj)
+
+	def typeKey(self, xtype):
+		return (xtype.isExisting(), xtype.obj)
+
+	def keyGraphObj(self, key):
+		region = self.storeGraph.regionHint
+		obj = region.object(self.keyType(key))
+		self.logObj(obj)
+		return obj
+
 	def objType(self, obj):
 		self.ensureLoaded(obj)
 		if obj.isAbstract():
@@ -35,12 +112,9 @@ class ImageBuilder(object):
 			return self.canonical.existingType(obj)
 
 	def objGraphObj(self, obj):
-		xtype  = self.objType(obj)
-
-		region = self.storeGraph.regionHint
-		obj = region.object(xtype)
-		self.logObj(obj)
-		return obj
+		key = self.objKey(obj)
+		self.snapshot.ops.append(('object', key))
+		return self.keyGraphObj(key)
 
 	def logObj(self, obj):
 		if obj not in self.allObjects:
@@ -89,28 +163,30 @@ class ImageBuilder(object):
 
 		return CallerArgs(selfarg, args, kwds, varg, karg, None)
 
-	def attachAttr(self, root):
-		pt = root.xtype.obj.pythonType()
+	def attachField(self, root, pt, name, types):
+		descriptorName = self.compiler.slots.uniqueSlotName(getattr(pt, name))
+		nameObj = self.compiler.extractor.getObject(descriptorName)
+		fieldName = self.canonical.fieldName('Attribute', nameObj)
+		field = root.field(fieldName, self.storeGraph.regionHint)
 
-		for t in pt.mro():
-			fieldtypes = getattr(t, '__fieldtypes__', None)
-			if not isinstance(fieldtypes, dict): continue
+		for ft in types:
+			inst = self.compiler.extractor.getInstance(ft)
+			field.initializeType(self.objType(inst))
 
-			for name, types in fieldtypes.iteritems():
-				descriptorName = self.compiler.slots.uniqueSlotName(getattr(pt, name))
-				nameObj = self.compiler.extractor.getObject(descriptorName)
-				fieldName = self.canonical.fieldName('Attribute', nameObj)
-				field = root.field(fieldName, self.storeGraph.regionHint)
+		return field
 
-				if isinstance(types, type):
-					types = (types,)
+	def attachAttr(self, root):
+		pt = root.xtype.obj.pythonType()
+		key = self.typeKey(root.xtype)
 
-				for ft in types:
-					inst = self.compiler.extractor.getInstance(ft)
-					field.initializeType(self.objType(inst))
+		self.snapshot.signatures[key] = fieldTypesSignature(pt)
 
-				for obj in field:
-					self.logObj(obj)
+		for name, types in fieldTypes(pt):
+			self.snapshot.ops.append(('field', key, pt, name, types))
+			field = self.attachField(root, pt, name, types)
+
+			for obj in field:
+				self.logObj(obj)
 
 	def process(self):
 		interface = self.prgm.interface
@@ -118,15 +194,147 @@ class ImageBuilder(object):
 		for entryPoint in interface.entryPoint:
 			args = self.resolveEntryPoint(entryPoint)
 			self.entryPoints.append((entryPoint, args))
+			self.snapshot.entryPoints.append(self.snapshot.mapArgs(self.snapshot.argsTuple(args), self.typeKey))
 
 		while self.dirtyObjects:
 			obj = self.dirtyObjects.pop()
 			self.attachAttr(obj)
 
+	def replay(self, snapshot):
+		# Rebuild the image into a fresh store graph without walking the types.
+		for op in snapshot.ops:
+			if op[0] == 'object':
+				self.keyGraphObj(op[1])
+			else:
+				_, key, pt, name, types = op
+				self.attachField(self.keyGraphObj(key), pt, name, types)
+
+		interface = self.prgm.interface
+		for entryPoint, args in zip(interface.entryPoint, snapshot.entryPoints):
+			self.entryPoints.append((entryPoint, snapshot.callerArgs(snapshot.mapArgs(args, self.keyType))))
+
+		self.snapshot = snapshot
+
+
+### On-disk image cache ###
+
+# Objects are stored as references to the Python objects they were extracted from.
+# Only objects that can be found by name are stored, anything pickled by value
+# would load as a different object.
+def keyToDesc(extractor, key):
+	existing, obj = key
+	if existing and isinstance(obj, program.Object):
+		return ('existing', pyObjDesc(obj.pyobj))
+	elif not existing and obj.isAbstract() and extractor.getInstance(obj.type.pyobj) is obj:
+		return ('instance', pyObjDesc(obj.type.pyobj))
+	else:
+		raise Uncacheable, "cannot describe %r" % (obj,)
+
+def descToKey(extractor, desc):
+	kind, pydesc = desc
+	if kind == 'existing':
+		return (True, extractor.getObject(descPyObj(pydesc)))
+	else:
+		return (False, extractor.getInstance(descPyObj(pydesc)))
+
+def mapOps(ops, f):
+	return [(op[0], f(op[1]))+tuple(op[2:]) for op in ops]
+
+def mapSignatures(signatures, f):
+	return dict([(f(key), signature) for key, signature in signatures.iteritems()])
+
+def cacheFile(compiler, snapshot):
+	directory = compiler.options.get('imageCache')
+	if directory is None: return None
+
+	# Keyed by the extracted objects the entry points pass in.
+	extractor = compiler.extractor
+	entryPoints = [snapshot.mapArgs(args, lambda key: keyToDesc(extractor, key)) for args in snapshot.entryPoints]
+	data = pickle.dumps(entryPoints, 2)
+	return os.path.join(directory, 'image-%s.pickle' % hashlib.sha1(data).hexdigest())
+
+def saveSnapshot(compiler, snapshot):
+	extractor = compiler.extractor
+	desc = lambda key: keyToDesc(extractor, key)
+
+	try:
+		filename = cacheFile(compiler, snapshot)
+		if filename is None: return False
+
+		data = (mapOps(snapshot.ops, desc),
+			[snapshot.mapArgs(args, desc) for args in snapshot.entryPoints],
+			mapSignatures(snapshot.signatures, desc))
+		data = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+	except (Uncacheable, pickle.PicklingError, TypeError), e:
+		compiler.console.output("Image not cached: %s" % e)
+		return False
+
+	directory = os.path.dirname(filename)
+	if not os.path.exists(directory): os.makedirs(directory)
+
+	f = open(filename, 'wb')
+	try:
+		f.write(data)
+	finally:
+		f.close()
+	return True
+
+def loadSnapshot(compiler, prgm):
+	# Resolve the entry point arguments to find the cache entry.
+	ib = ImageBuilder(compiler, prgm)
+	snapshot = ImageSnapshot()
+	for entryPoint in prgm.interface.entryPoint:
+		args = snapshot.argsTuple(ib.resolveEntryPoint(entryPoint))
+		snapshot.entryPoints.append(snapshot.mapArgs(args, ib.typeKey))
+
+	try:
+		filename = cacheFile(compiler, snapshot)
+	except (Uncacheable, pickle.PicklingError, TypeError):
+		return None
+
+	if filename is None or not os.path.exists(filename):
+		return None
+
+	try:
+		f = open(filename, 'rb')
+		try:
+			ops, entryPoints, signatures = pickle.load(f)
+		finally:
+			f.close()
+	except (IOError, EOFError, pickle.UnpicklingError, AttributeError, ImportError), e:
+		compiler.console.output("Image cache unreadable: %s" % e)
+		return None
+
+	extractor = compiler.extractor
+	key = lambda desc: descToKey(extractor, desc)
+
+	snapshot = ImageSnapshot()
+	snapshot.ops = mapOps(ops, key)
+	snapshot.entryPoints = [snapshot.mapArgs(args, key) for args in entryPoints]
+	snapshot.signatures = mapSignatures(signatures, key)
+
+	if not snapshot.valid():
+		compiler.console.output("Image cache stale")
+		return None
+
+	return snapshot
+
 
 def build(compiler, prgm):
+	snapshot = prgm.imageSnapshot
+	cached = snapshot is None and compiler.options.get('imageCache') is not None
+
+	if cached:
+		snapshot = loadSnapshot(compiler, prgm)
+
 	ib = ImageBuilder(compiler, prgm)
-	ib.process()
 
-	prgm.storeGraph  = ib.storeGraph
-	prgm.entryPoints = ib.entryPoints
+	if snapshot is None:
+		ib.process()
+		if cached: saveSnapshot(compiler, ib.snapshot)
+	else:
+		ib.replay(snapshot)
+
+	prgm.storeGraph    = ib.storeGraph
+	prgm.entryPoints   = ib.entryPoints
+	prgm.imageSnapshot = ib.snapshot
@@ -0,0 +1,145 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import collections
+import heapq
+import weakref
+
+from PADS.StrongConnectivity import StronglyConnectedComponents
+
+import analysis.cpasignature
+
+# Worklist strategies for the CPA solver.
+# Each worklist holds dirty constraints, a constraint is in the worklist at most once.
+# Per-constraint bookkeeping is weakly keyed, so it does not keep discarded
+# constraints alive when the solver does not retain them.
+
+class FIFOWorklist(object):
+	name = 'fifo'
+
+	def __init__(self, sys):
+		self.queue = collections.deque()
+
+	def append(self, constraint):
+		self.queue.append(constraint)
+
+	def pop(self):
+		return self.queue.popleft()
+
+	def fired(self, constraint):
+		pass
+
+	def __len__(self):
+		return len(self.queue)
+
+
+class LeastRecentlyFiredWorklist(object):
+	name = 'lrf'
+
+	def __init__(self, sys):
+		self.heap  = []
+		self.uid   = 0
+		self.clock = 0
+		self.lastFired = weakref.WeakKeyDictionary()
+
+	def append(self, constraint):
+		# Constraints that have never fired come first.
+		heapq.heappush(self.heap, (self.lastFired.get(constraint, -1), self.uid, constraint))
+		self.uid += 1
+
+	def pop(self):
+		return heapq.heappop(self.heap)[2]
+
+	def fired(self, constraint):
+		self.lastFired[constraint] = self.clock
+		self.clock += 1
+
+	def __len__(self):
+		return len(self.heap)
+
+
+# Orders constraints by the topological rank of their strongly connected
+# component in the constraint graph, so producers fire before consumers.
+# The graph grows during the solve, so ranks are recomputed as it doubles in size.
+# In the meantime, new constraints inherit the rank of the constraint that created them.
+class RankedWorklist(object):
+	name = 'ranked'
+
+	def __init__(self, sys, threshold=1000):
+		self.heap    = []
+		self.uid     = 0
+		self.rank    = weakref.WeakKeyDictionary()
+		self.current = 0
+
+		self.threshold = threshold
+		self.rankedSize = 0
+		self.rerankings = 0
+
+	def append(self, constraint):
+		rank = self.rank.get(constraint)
+		if rank is None:
+			rank = self.current
+			self.rank[constraint] = rank
+
+		heapq.heappush(self.heap, (rank, self.uid, constraint))
+		self.uid += 1
+
+	def pop(self):
+		if len(self.rank) > self.rankedSize*2+self.threshold:
+			self.rerank()
+
+		rank, uid, constraint = heapq.heappop(self.heap)
+		self.current = rank
+		return constraint
+
+	def fired(self, constraint):
+		pass
+
+	def successors(self, constraint):
+		succ = set()
+		for slot in constraint.writes():
+			if slot is None or slot is analysis.cpasignature.DoNotCare: continue
+
+			slot = slot.getForward()
+			for observer in slot.observers:
+				if observer is not constraint and observer in self.rank:
+					succ.add(observer)
+		return succ
+
+	def rerank(self):
+		G = dict([(constraint, self.successors(constraint)) for constraint in self.rank.keys()])
+
+		# Components are generated sinks first.
+		components = list(StronglyConnectedComponents(G))
+		numComponents = len(components)
+		for i, component in enumerate(components):
+			for constraint in component:
+				self.rank[constraint] = numComponents-i
+
+		self.heap = [(self.rank[constraint], uid, constraint) for rank, uid, constraint in self.heap]
+		heapq.heapify(self.heap)
+
+		self.rankedSize = len(self.rank)
+		self.rerankings += 1
+
+	def __len__(self):
+		return len(self.heap)
+
+
+worklists = dict([(cls.name, cls) for cls in (FIFOWorklist, LeastRecentlyFiredWorklist, RankedWorklist)])
+
+def createWorklist(name, sys):
+	assert name in worklists, "Unknown worklist strategy %r" % name
+	return worklists[name](sys)
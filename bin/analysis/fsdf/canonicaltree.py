@@ -49,6 +49,10 @@ class ConditionManager(object):
 	def __init__(self):
 		self.conditions = {}
 
+		# Reorder statistics
+		self.reorders = 0
+		self.swaps    = 0
+
 	def condition(self, name, values):
 		if name not in self.conditions:
 			cond = Condition(name, len(self.conditions), list(values))
@@ -66,6 +70,76 @@ class ConditionManager(object):
 			cond.validate(values)
 		return cond
 
+	### Reordering ###
+
+	def _size(self, managers):
+		return sum([manager.treeNodes() for manager in managers])
+
+	# Swaps the conditions at uid index and index+1.
+	def _swap(self, managers, levels, index):
+		x = levels[index+1]
+		y = levels[index]
+
+		# Find the nodes that must be restructured, before the order changes.
+		work = [(manager, manager._swapCandidates(x, y)) for manager in managers]
+
+		x.uid, y.uid = index, index+1
+		levels[index], levels[index+1] = x, y
+
+		for manager, nodes in work:
+			for node in nodes:
+				manager._swapNode(node, x, y)
+
+		self.swaps += 1
+
+	def _sift(self, managers, levels, cond, maxGrowth):
+		size  = self._size(managers)
+		limit = size*maxGrowth
+		best  = (size, cond.uid)
+
+		# Move the condition to the bottom, then to the top...
+		while cond.uid > 0:
+			self._swap(managers, levels, cond.uid-1)
+			size = self._size(managers)
+			best = min(best, (size, cond.uid))
+			if size > limit: break
+
+		while cond.uid < len(levels)-1:
+			self._swap(managers, levels, cond.uid)
+			size = self._size(managers)
+			best = min(best, (size, cond.uid))
+			if size > limit: break
+
+		# ...and leave it where the trees were smallest.
+		target = best[1]
+		while cond.uid > target:
+			self._swap(managers, levels, cond.uid-1)
+		while cond.uid < target:
+			self._swap(managers, levels, cond.uid)
+
+	# Sifting, each condition is moved to the position that minimizes the
+	# number of tree nodes in the managers.  Nodes are restructured in
+	# place, so outstanding references to trees remain valid.
+	# Returns the number of tree nodes before and after.
+	def reorder(self, managers, maxGrowth=2):
+		for manager in managers:
+			manager.flushCaches()
+
+		levels = sorted(self.conditions.itervalues(), key=lambda cond: cond.uid)
+		before = self._size(managers)
+
+		# Sift the conditions with the most nodes first.
+		counts = dict([(cond, 0) for cond in levels])
+		for manager in managers:
+			for node in manager.trees:
+				counts[node.cond] += 1
+
+		for cond in sorted(levels, key=lambda cond: -counts[cond]):
+			self._sift(managers, levels, cond, maxGrowth)
+
+		self.reorders += 1
+		return before, self._size(managers)
+
 
 class AbstractNode(object):
 	__slots__ = '_hash', '__weakref__'
@@ -100,6 +174,12 @@ class LeafNode(AbstractNode):
 	def leaf(self):
 		return True
 
+# The branches are canonical, so they are hashed by identity.
+# This also keeps the hash of a node stable when reordering restructures
+# its children in place.
+def treeHash(cond, branches):
+	return hash((cond, tuple([id(branch) for branch in branches])))
+
 class TreeNode(AbstractNode):
 	__slots__ = 'cond', 'branches'
 
@@ -107,7 +187,7 @@ class TreeNode(AbstractNode):
 		assert len(branches) == len(cond.values), "Expected %d branches, got %d." % (len(cond.values), len(branches))
 		self.cond     = cond
 		self.branches = branches
-		self._hash    = hash((cond, branches))
+		self._hash    = treeHash(cond, branches)
 
 	def __eq__(self, other):
 		return self is other or (type(self) == type(other) and self.cond == other.cond and self.branches == other.branches)
@@ -131,13 +211,70 @@ class NoValue(object):
 	__slots__ = ()
 noValue = NoValue()
 
+# Tree nodes are canonical, so results can be kept between computations.
+# Entries live for two generations: when the current generation grows past
+# the limit it becomes the previous one, and entries that are used again
+# are moved back into the current generation.
+defaultCacheLimit = 1<<15
+
+defaultCollectThreshold = 1<<16
+
+class ComputedTable(object):
+	__slots__ = 'limit', 'current', 'previous', 'hits', 'misses', 'evictions'
+
+	def __init__(self, limit=defaultCacheLimit):
+		self.limit     = limit
+		self.current   = {}
+		self.previous  = {}
+		self.hits      = 0
+		self.misses    = 0
+		self.evictions = 0
+
+	def lookup(self, key):
+		result = self.current.get(key, noValue)
+		if result is noValue:
+			result = self.previous.pop(key, noValue)
+			if result is not noValue:
+				self.current[key] = result
+		return result
+
+	def store(self, key, result):
+		self.current[key] = result
+		return result
+
+	# Called between computations, so entries in use are never evicted.
+	def age(self):
+		if len(self.current) > self.limit:
+			self.evictions += len(self.previous)
+			self.previous = self.current
+			self.current  = {}
+
+	# Drops the entries that were not used since the last collection.
+	def collect(self):
+		self.evictions += len(self.previous)
+		self.previous = self.current
+		self.current  = {}
+
+	def clear(self):
+		self.current  = {}
+		self.previous = {}
+
+	def hitRate(self):
+		total = self.hits+self.misses
+		return float(self.hits)/total if total else 0.0
+
+	def __len__(self):
+		return len(self.current)+len(self.previous)
+
 class UnaryTreeFunction(object):
-	__slots__ = ['manager', 'func', 'cache', 'cacheHit', 'cacheMiss']
+	__slots__ = ['manager', 'func', 'cache']
 
 	def __init__(self, manager, func):
 		self.manager    = manager
 		self.func       = func
-		self.cache     = {}
+		self.cache      = ComputedTable()
+
+		manager.registerFunction(self)
 
 	def compute(self, a):
 		if a.cond.uid == -1:
@@ -151,22 +288,20 @@ class UnaryTreeFunction(object):
 	def _apply(self, a):
 		# See if we've alread computed this.
 		key = a
-		if key in self.cache:
-			self.cacheHit += 1
-			return self.cache[key]
+		result = self.cache.lookup(key)
+		if result is not noValue:
+			self.cache.hits += 1
+			return result
 		else:
-			self.cacheMiss += 1
+			self.cache.misses += 1
 
 		result = self.compute(a)
 
-		return self.cache.setdefault(key, result)
+		return self.cache.store(key, result)
 
 	def __call__(self, a):
-		self.cacheHit  = 0
-		self.cacheMiss = 0
 		result = self._apply(a)
-		#print "%d/%d" % (self.cacheHit, self.cacheHit+self.cacheMiss)
-		self.cache.clear() # HACK don't retain cache between computations?
+		self.cache.age()
 		return result
 
 class UnaryTreeVisitor(object):
@@ -186,10 +321,11 @@ class UnaryTreeVisitor(object):
 				self._apply(context, branch)
 
 	def _apply(self, context, a):
-		# See if we've alread computed this.
+		# Shared subtrees only need to be visited once.
 		key = a
 		if key in self.cache:
 			self.cacheHit += 1
+			return
 		else:
 			self.cacheMiss += 1
 
@@ -201,14 +337,16 @@ class UnaryTreeVisitor(object):
 		self.cacheMiss = 0
 		result = self._apply(context, a)
 		#print "%d/%d" % (self.cacheHit, self.cacheHit+self.cacheMiss)
-		self.cache.clear() # HACK don't retain cache between computations?
+
+		# The visit has side effects on the context, so it cannot be reused.
+		self.cache.clear()
 		return result
 
 class BinaryTreeFunction(object):
 	__slots__ = ['manager', 'func', 'symmetric', 'stationary',
 			'leftIdentity', 'rightIdentity',
 			'leftNull', 'rightNull',
-			'cache', 'cacheHit', 'cacheMiss']
+			'cache']
 
 	def __init__(self, manager, func, symmetric=False, stationary=False,
 			identity=noValue, leftIdentity=noValue, rightIdentity=noValue,
@@ -248,7 +386,9 @@ class BinaryTreeFunction(object):
 			self.leftNull  = leftNull
 			self.rightNull = rightNull
 
-		self.cache     = {}
+		self.cache     = ComputedTable()
+
+		manager.registerFunction(self)
 
 	def compute(self, a, b):
 		if self.stationary and a is b:
@@ -269,18 +409,19 @@ class BinaryTreeFunction(object):
 	def _apply(self, a, b):
 		# See if we've alread computed this.
 		key = (a, b)
-		if key in self.cache:
-			self.cacheHit += 1
-			return self.cache[key]
+		result = self.cache.lookup(key)
+		if result is not noValue:
+			self.cache.hits += 1
+			return result
 		else:
 			if self.symmetric:
 				# If the function is symetric, try swaping the arguments.
-				altkey = (b, a)
-				if altkey in self.cache:
-					self.cacheHit += 1
-					return self.cache[altkey]
+				result = self.cache.lookup((b, a))
+				if result is not noValue:
+					self.cache.hits += 1
+					return result
 
-			self.cacheMiss += 1
+			self.cache.misses += 1
 
 		# Use identities to bypass computation.
 		# This is not very helpful for leaf / leaf pairs, but provides
@@ -297,14 +438,11 @@ class BinaryTreeFunction(object):
 			# Cache miss, no identities, must compute
 			result = self.compute(a, b)
 
-		return self.cache.setdefault(key, result)
+		return self.cache.store(key, result)
 
 	def __call__(self, a, b):
-		self.cacheHit  = 0
-		self.cacheMiss = 0
 		result = self._apply(a, b)
-		#print "%d/%d" % (self.cacheHit, self.cacheHit+self.cacheMiss)
-		self.cache.clear() # HACK don't retain cache between computations?
+		self.cache.age()
 		return result
 
 class TreeFunction(object):
@@ -312,7 +450,9 @@ class TreeFunction(object):
 		self.manager  = manager
 		self.func     = func
 		self.multiout = multiout
-		self.cache    = {}
+		self.cache    = ComputedTable()
+
+		manager.registerFunction(self)
 
 	def compute(self, args):
 		maxcond = max(arg.cond for arg in args)
@@ -339,22 +479,20 @@ class TreeFunction(object):
 	def _apply(self, args):
 		# See if we've alread computed this.
 		key = args
-		if key in self.cache:
-			self.cacheHit += 1
-			return self.cache[key]
+		result = self.cache.lookup(key)
+		if result is not noValue:
+			self.cache.hits += 1
+			return result
 		else:
-			self.cacheMiss += 1
+			self.cache.misses += 1
 
 		result = self.compute(args)
 
-		return self.cache.setdefault(key, result)
+		return self.cache.store(key, result)
 
 	def __call__(self, *args):
-		self.cacheHit  = 0
-		self.cacheMiss = 0
 		result = self._apply(args)
-		#print "%d/%d" % (self.cacheHit, self.cacheHit+self.cacheMiss)
-		self.cache.clear() # HACK don't retain cache between computations?
+		self.cache.age()
 		return result
 
 
@@ -368,8 +506,93 @@ class CanonicalTreeManager(object):
 
 		self.cache      = {}
 
+		# Tree functions with computed tables.
+		self.functions  = []
+
+		# Node statistics
+		self.created     = 0
+		self.peakNodes   = 0
+		self.collections = 0
+
+		# The unique tables are weak, so nodes die as soon as they are
+		# unreferenced.  The computed tables keep them alive, however,
+		# so they are flushed at safe points once the tables grow large.
+		self.collectThreshold = defaultCollectThreshold
+		self.nextCollect      = self.collectThreshold
+
+	def registerFunction(self, func):
+		self.functions.append(func)
+
+	def liveNodes(self):
+		return len(self.trees)+len(self.leaves)
+
+	def _created(self):
+		self.created += 1
+		live = self.liveNodes()
+		if live > self.peakNodes: self.peakNodes = live
+
+	def collect(self):
+		self.cache.clear()
+		for func in self.functions:
+			func.cache.collect()
+		self.collections += 1
+
+		# Only collect again once the live nodes have doubled.
+		self.nextCollect = max(self.collectThreshold, self.liveNodes()*2)
+
+	# Must only be called between tree operations.
+	def safePoint(self):
+		if self.liveNodes() >= self.nextCollect:
+			self.collect()
+
+	def nodeStats(self):
+		return self.liveNodes(), self.peakNodes, self.created, self.collections
+
+	def treeNodes(self):
+		return len(self.trees)
+
+	# The computed tables are keyed by hash, which reordering changes.
+	def flushCaches(self):
+		self.cache.clear()
+		for func in self.functions:
+			func.cache.clear()
+
+	def _swapCandidates(self, x, y):
+		# Nodes on x that have children on y
+		nodes = []
+		for node in self.trees:
+			if node.cond is x:
+				for branch in node.branches:
+					if branch.cond is y:
+						nodes.append(node)
+						break
+		return nodes
+
+	def _swapNode(self, node, x, y):
+		# y is now above x, rebuild the node as a y node with x children.
+		cofactors = [branch.iter(y) for branch in node.branches]
+		branches  = tuple([self.tree(x, tuple([cofactor[i] for cofactor in cofactors])) for i in range(len(y.values))])
+
+		# The hash changes, so the node must be rehashed in the unique table.
+		del self.trees[node]
+		node.cond     = y
+		node.branches = branches
+		node._hash    = treeHash(y, branches)
+
+		result = self.trees[node]
+		assert result is node, "Reordering broke canonicity."
+
+	def cacheStats(self):
+		hits      = sum([func.cache.hits for func in self.functions])
+		misses    = sum([func.cache.misses for func in self.functions])
+		evictions = sum([func.cache.evictions for func in self.functions])
+		return hits, misses, evictions
+
 	def leaf(self, value):
-		return self.leaves[LeafNode(self.coerce(value))]
+		node   = LeafNode(self.coerce(value))
+		result = self.leaves[node]
+		if result is node: self._created()
+		return result
 
 	def tree(self, cond, branches):
 		assert isinstance(branches, tuple), type(branches)
@@ -385,7 +608,10 @@ class CanonicalTreeManager(object):
 			# They're all the same, don't make a tree.
 			return first
 
-		return self.trees[TreeNode(cond, branches)]
+		node   = TreeNode(cond, branches)
+		result = self.trees[node]
+		if result is node: self._created()
+		return result
 
 	def _ite(self, f, a, b):
 		# If f is a constant, pick either a or b.
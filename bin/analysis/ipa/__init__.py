@@ -46,6 +46,19 @@ def evaluateWithImage(compiler, prgm):
 		print "%5d contexts" % len(analysis.contexts)
 		print "%.2f ms decompile" % (analysis.decompileTime*1000.0)
 
+		rounds, visited, updated, elapsed = analysis.callGraphStats()
+		print "%5d call graph rounds, %d contexts visited, %d updated" % (rounds, visited, updated)
+		print "%.2f ms call graph (%.3f ms/round)" % (elapsed*1000.0, elapsed*1000.0/max(rounds, 1))
+		print "%5d recursive components, %d component iterations" % (analysis.recursiveComponents, analysis.componentIterations)
+
+		waves, width, parallelism = analysis.bottomUpStats()
+		print "%5d bottom up waves, %d max width, %.2fx available parallelism" % (waves, width, parallelism)
+
+		for name, manager in (('value', analysis.valuemanager), ('critical', analysis.criticalmanager)):
+			memo = manager.memo
+			if memo is not None:
+				print "%5d/%d %s set memo hits/misses (%d evicted)" % (memo.hits, memo.misses, name, memo.evictions)
+
 	with compiler.console.scope('ipa dump'):
 		dumpAnalysisResults(analysis)
 
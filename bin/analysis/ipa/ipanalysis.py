@@ -28,6 +28,8 @@ from . escape import objectescape
 from . import summary
 from util.monkeypatch import xtypes
 
+from PADS.StrongConnectivity import StronglyConnectedComponents
+
 class IPAnalysis(object):
 	def __init__(self, compiler, canonical, existingPolicy, externalPolicy):
 		self.compiler = compiler
@@ -40,16 +42,30 @@ class IPAnalysis(object):
 		self.objs = {}
 		self.contexts = {}
 
+		# Contexts with calls that may have new targets.
+		self.dirtyContexts = []
+
+		# (contexts visited, contexts changed, time) for each call graph update.
+		self.callGraphRounds = []
+
 		self.root = self.getContext(cpa.externalContext)
 		self.root.external = True
 
 		self.liveCode = set()
 
-		self.valuemanager    = setmanager.CachedSetManager()
-		self.criticalmanager = setmanager.CachedSetManager()
+		self.valuemanager    = setmanager.createSetManager()
+		self.criticalmanager = setmanager.createSetManager()
 
 		self.dirtySlots = []
 
+		# Bottom up statistics
+		self.maxComponentIterations = 100
+		self.componentIterations    = 0
+		self.recursiveComponents    = 0
+
+		# The width of each wave, for each bottom up pass.
+		self.bottomUpWaves = []
+
 		self.decompileTime = 0.0
 
 		self.trace = False
@@ -113,17 +129,46 @@ class IPAnalysis(object):
 	def dirtyConstraints(self):
 		return bool(self.dirtySlots)
 
+	def dirtyContext(self, context):
+		self.dirtyContexts.append(context)
+
 	def updateCallGraph(self):
 		if self.trace: print "update"
+		start = time.clock()
 		changed = False
 
-		# HACK dictionary size may change...
-		for context in tuple(self.contexts.itervalues()):
-			changed |= context.updateCallgraph()
+		visited = 0
+		updated = 0
+
+		# Only contexts with dirty calls are visited.
+		# Resolving a call may dirty more contexts, they are handled in the same round.
+		while self.dirtyContexts:
+			context = self.dirtyContexts.pop()
+			visited += 1
+			if context.updateCallgraph():
+				updated += 1
+				changed = True
 		if self.trace: print
 
+		self.callGraphRounds.append((visited, updated, time.clock()-start))
+
 		return changed
 
+	def bottomUpStats(self):
+		# The average available parallelism of the last bottom up pass.
+		if not self.bottomUpWaves:
+			return 0, 0, 1.0
+
+		widths = self.bottomUpWaves[-1]
+		return len(widths), max(widths+[0]), float(sum(widths))/max(len(widths), 1)
+
+	def callGraphStats(self):
+		rounds  = len(self.callGraphRounds)
+		visited = sum([round[0] for round in self.callGraphRounds])
+		updated = sum([round[1] for round in self.callGraphRounds])
+		elapsed = sum([round[2] for round in self.callGraphRounds])
+		return rounds, visited, updated, elapsed
+
 	def updateConstraints(self):
 		#if self.trace: print "resolve"
 		while self.dirtySlots:
@@ -144,40 +189,117 @@ class IPAnalysis(object):
 			node = context.dirtycriticals.pop()
 			node.critical.propagate(context, node)
 
+	def callGraph(self):
+		# The contexts reachable from the root, and the contexts they invoke.
+		G = {}
+		pending = [self.root]
+		while pending:
+			context = pending.pop()
+			if context in G: continue
+
+			callees = [invoke.dst for invoke in context.invokeOut.itervalues()]
+			G[context] = callees
+			pending.extend(callees)
+		return G
+
 	def contextBottomUp(self, context):
-		if context not in self.processed:
-			self.processed.add(context)
-			self.path.append(context)
+		# Apply the summaries of the callees.
+		for invoke in context.invokeOut.itervalues():
+			invoke.apply()
 
-			# Process children first
-			for invoke in context.invokeOut.itervalues():
-				dst = invoke.dst
-				self.contextBottomUp(dst)
-				invoke.apply()
+		self.updateConstraints()
 
-			self.updateConstraints()
+		changed = False
 
-			if context.summary.dirty:
-				self.propagateCriticals(context)
-				objectescape.process(context)
+		if context.summary.dirty:
+			self.propagateCriticals(context)
+			objectescape.process(context)
 
-				summary.update(context)
+			changed = summary.update(context)
 
-				self.updateConstraints() # TODO only once?
+			self.updateConstraints() # TODO only once?
 
+		return changed
 
-			self.path.pop()
-		else:
-			assert context not in self.path, "Recursive cycle detected in call graph"
+	def componentBottomUp(self, component):
+		contexts = list(component)
+		recursive = len(contexts) > 1 or contexts[0] in component[contexts[0]]
+
+		if recursive:
+			self.recursiveComponents += 1
+
+		# Recursive components are iterated until the summaries stop changing.
+		iterations = 0
+		while True:
+			iterations += 1
+			changed = False
+
+			for context in contexts:
+				changed |= self.contextBottomUp(context)
+
+			if not recursive or not changed:
+				break
+
+			if iterations >= self.maxComponentIterations:
+				print "Summaries of %d recursive contexts did not converge after %d iterations" % (len(contexts), iterations)
+				break
+
+		self.componentIterations += iterations
+
+	def componentSchedule(self, G):
+		# Tarjan's algorithm (iterative), the components are produced callees first.
+		components = list(StronglyConnectedComponents(G))
+
+		index = {}
+		for i, component in enumerate(components):
+			for context in component:
+				index[context] = i
+
+		# Condense the call graph into a DAG of components.
+		waiting = [0]*len(components)
+		callers = [[] for component in components]
+
+		for i, component in enumerate(components):
+			callees = set()
+			for context in component:
+				for dst in G[context]:
+					callees.add(index[dst])
+			callees.discard(i)
+
+			waiting[i] = len(callees)
+			for callee in callees:
+				callers[callee].append(i)
+
+		# Wavefronts, every component in a wave only depends on earlier waves.
+		waves = []
+		ready = [i for i in range(len(components)) if not waiting[i]]
+		while ready:
+			waves.append([components[i] for i in ready])
+
+			next = []
+			for i in ready:
+				for caller in callers[i]:
+					waiting[caller] -= 1
+					if not waiting[caller]:
+						next.append(caller)
+			ready = sorted(next)
+
+		assert sum([len(wave) for wave in waves]) == len(components)
+		return waves
 
 	def bottomUp(self):
 		print "bottom up"
-		self.processed = set()
-		self.path = []
 
 		for context in self.contexts.itervalues():
 			context.summary.fresh = False
 
-		self.contextBottomUp(self.root)
+		waves = self.componentSchedule(self.callGraph())
+
+		# The components in a wave are independent of each other.
+		for wave in waves:
+			for component in wave:
+				self.componentBottomUp(component)
+
+		self.bottomUpWaves.append([len(wave) for wave in waves])
 
 		self.updateCallGraph()
@@ -44,6 +44,9 @@ class Context(object):
 		self.dirtyccalls      = []
 		self.dirtyfcalls      = []
 
+		# Is this context queued for a call graph update?
+		self.callgraphDirty   = False
+
 		self.invokeIn  = {}
 		self.invokeOut = {}
 
@@ -116,14 +119,22 @@ class Context(object):
 	def dirtySlot(self, slot):
 		self.analysis.dirtySlot(slot)
 
+	def markCallgraphDirty(self):
+		if not self.callgraphDirty:
+			self.callgraphDirty = True
+			self.analysis.dirtyContext(self)
+
 	def dirtyCall(self, call):
 		self.dirtycalls.append(call)
+		self.markCallgraphDirty()
 
 	def dirtyCCall(self, call):
 		self.dirtyccalls.append(call)
+		self.markCallgraphDirty()
 
 	def dirtyFCall(self, call):
 		self.dirtyfcalls.append(call)
+		self.markCallgraphDirty()
 
 	def constraint(self, constraint):
 		self.constraints.append(constraint)
@@ -195,6 +206,7 @@ class Context(object):
 		self.constraint(constraint)
 
 	def updateCallgraph(self):
+		self.callgraphDirty = False
 		changed = False
 
 		for queue in (self.dirtycalls, self.dirtyccalls, self.dirtyfcalls):
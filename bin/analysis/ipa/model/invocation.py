@@ -34,6 +34,9 @@ class Invocation(object):
 
 		self.slotReverse = collections.defaultdict(list)
 
+		# The version of the callee summary last applied.
+		self.appliedVersion = None
+
 	def copyDown(self, obj):
 		if obj not in self.objForward:
 			remapped = self.dst.analysis.objectName(obj.xtype, qualifiers.DN)
@@ -83,8 +86,14 @@ class Invocation(object):
 
 
 	def apply(self):
-		if self.dst.summary.fresh:
-			self.dst.summary.apply(self)
+		summary = self.dst.summary
+		if summary.fresh and summary.version != self.appliedVersion:
+			self.appliedVersion = summary.version
+			summary.apply(self)
+
+			# The callee may add objects to the caller without adding
+			# constraints, so the caller's summary must be recomputed.
+			self.src.summary.dirty = True
 
 	def upwardSlots(self, slot):
 		if slot not in self.slotReverse:
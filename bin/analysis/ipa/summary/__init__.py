@@ -23,6 +23,9 @@ class SummaryCopy(object):
 	def apply(self, invoke):
 		invoke.applyCopy(self.src, self.dst)
 
+	def key(self):
+		return ('copy', self.src, self.dst)
+
 class SummaryLoad(object):
 	def __init__(self, obj, fieldtype, field, dst):
 		self.obj = obj
@@ -33,6 +36,9 @@ class SummaryLoad(object):
 	def apply(self, invoke):
 		invoke.applyLoad(self.obj, self.fieldtype, self.field, self.dst)
 
+	def key(self):
+		return ('load', self.obj, self.fieldtype, self.field, self.dst)
+
 class Summary(object):
 	def __init__(self):
 		self.slots = {}
@@ -42,6 +48,15 @@ class Summary(object):
 		self.dirty = False
 		self.fresh = False
 
+		# Bumped whenever an update changes the contents.
+		self.version = 0
+		self.lastKey = None
+
+	def key(self):
+		ops  = frozenset([op.key() for op in self.ops])
+		objs = frozenset([(slot, frozenset(objs)) for slot, objs in self.slotObjs.iteritems()])
+		return ops, objs
+
 	def reset(self):
 		self.slots = {}
 		self.ops   = []
@@ -87,10 +102,11 @@ class Summary(object):
 		for slot, objs in self.slotObjs.iteritems():
 			invoke.applyObjs(slot, objs)
 
+# Returns True if the contents of the summary changed.
 def update(context):
 	summary = context.summary
 	if not summary.dirty:
-		return
+		return False
 
 	summary.dirty = False
 	summary.fresh = True
@@ -101,3 +117,11 @@ def update(context):
 		context.summary.handleSlot(context, param)
 
 	assert not context.criticalStores
+
+	key = summary.key()
+	if key != summary.lastKey:
+		summary.lastKey = key
+		summary.version += 1
+		return True
+	else:
+		return False
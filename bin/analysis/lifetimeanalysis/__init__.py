@@ -545,8 +545,8 @@ class LifetimeAnalysis(object):
 		del self.rm
 
 	def createDB(self, compiler, prgm):
-		self.annotationCount = 0
-		self.annotationCache = {}
+		pool = compiler.annotationPool
+		lookups, hits = pool.lookups, pool.hits
 
 		readDB   = self.rm.opReadDB
 		modifyDB = self.rm.opModifyDB
@@ -561,8 +561,8 @@ class LifetimeAnalysis(object):
 				live.append(annotations.annotationSet(self.live[key]))
 				killed.append(annotations.annotationSet(self.contextKilled[key]))
 
-			code.rewriteAnnotation(live=annotations.makeContextualAnnotation(live),
-				killed=annotations.makeContextualAnnotation(killed))
+			code.rewriteAnnotation(live=pool.contextual(live, code),
+				killed=pool.contextual(killed, code))
 
 			# Annotate the ops
 			ops, lcls = getOps(code)
@@ -603,21 +603,16 @@ class LifetimeAnalysis(object):
 
 					aout.append(annotations.annotationSet(calloc))
 
-				opReads     = annotations.makeContextualAnnotation(rout)
-				opModifies  = annotations.makeContextualAnnotation(mout)
-				opAllocates = annotations.makeContextualAnnotation(aout)
-
-				opReads     = self.annotationCache.setdefault(opReads,     opReads)
-				opModifies  = self.annotationCache.setdefault(opModifies,  opModifies)
-				opAllocates = self.annotationCache.setdefault(opAllocates, opAllocates)
-				self.annotationCount += 3
+				opReads     = pool.contextual(rout, code)
+				opModifies  = pool.contextual(mout, code)
+				opAllocates = pool.contextual(aout, code)
 
 				op.rewriteAnnotation(reads=opReads, modifies=opModifies, allocates=opAllocates)
 
-		compiler.console.output("Annotation compression %f - %d" % (float(len(self.annotationCache))/max(self.annotationCount, 1), self.annotationCount))
+		pool.collect(prgm.liveCode)
 
-		del self.annotationCache
-		del self.annotationCount
+		lookups, hits = pool.lookups-lookups, pool.hits-hits
+		compiler.console.output("Annotation hits %d/%d (%.1f%%)" % (hits, lookups, 100.0*hits/max(lookups, 1)))
 
 def evaluate(compiler, prgm):
 	with compiler.console.scope('lifetime analysis'):
@@ -80,10 +80,12 @@ class OrderConstraints(object):
 
 
 class RegionBasedShapeAnalysis(object):
-	def __init__(self, extractor, cpacanonical, info):
+	def __init__(self, extractor, cpacanonical, info, worklist=None):
+		if worklist is None: worklist = dataflow.PriorityWorklist()
+
 		self.extractor   = extractor
 		self.canonical   = canonical.CanonicalObjects()
-		self.worklist    = dataflow.Worklist()
+		self.worklist    = worklist
 		self.environment = dataflow.DataflowEnvironment()
 
 		self.constraintbuilder = constraintbuilder.ShapeConstraintBuilder(self, self.processCode)
@@ -104,7 +106,7 @@ class RegionBasedShapeAnalysis(object):
 		if not success:
 			print
 			print "ITERATION LIMIT HIT"
-			self.worklist.worklist[:] = []
+			self.worklist.clear()
 		return success
 
 	def processCode(self, code):
@@ -237,6 +239,11 @@ class RegionBasedShapeAnalysis(object):
 	def dumpStatistics(self):
 		print "Entries:", len(self.environment._secondary)
 		print "Unique Config:", len(self.canonical.configurationCache)
+		used, unshared = self.environment.memory()
+		print "Shared Entries:", "%d/%d" % (self.environment.shared, self.environment.stores)
+		print "Path Memory:", "%d bytes (%d saved by sharing)" % (used, unshared-used)
+		print "Merge Time:", "%.2f ms" % (self.environment.mergeTime*1000.0)
+		print "Worklist:", type(self.worklist).__name__
 		print "Max Worklist:", self.worklist.maxLength
 		print "Steps:", "%d/%d" % (self.worklist.usefulSteps, self.worklist.steps)
 
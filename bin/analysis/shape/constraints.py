@@ -109,7 +109,7 @@ class SplitMergeInfo(object):
 			lut[splitIndex] = {}
 
 		if not index in lut[splitIndex]:
-			lut[splitIndex][index] = secondary if canSteal else secondary.copy()
+			lut[splitIndex][index] = secondary if canSteal else secondary.share()
 			changed = True
 		else:
 			changed = lut[splitIndex][index].merge(secondary)
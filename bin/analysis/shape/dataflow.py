@@ -14,13 +14,21 @@
 
 from __future__ import absolute_import
 
+import heapq
+import time
+
 class DataflowEnvironment(object):
-	__slots__ = '_secondary', 'observers'
+	__slots__ = '_secondary', 'observers', 'stores', 'shared', 'mergeTime'
 
 	def __init__(self):
 		self._secondary   = {}
 		self.observers = {}
 
+		# Statistics
+		self.stores    = 0
+		self.shared    = 0
+		self.mergeTime = 0.0
+
 	def addObserver(self, index, constraint):
 		if not index in self.observers:
 			self.observers[index] = [constraint]
@@ -31,14 +39,21 @@ class DataflowEnvironment(object):
 	def merge(self, sys, point, context, index, secondary, canSteal=False):
 		assert not secondary.paths.containsAged()
 
+		start = time.clock()
+
 		# Do the merge
 		key = (point, context, index)
 		if not key in self._secondary:
-			self._secondary[key] = secondary if canSteal else secondary.copy()
+			# Path information is never modified once merged, so it can be shared.
+			self._secondary[key] = secondary if canSteal else secondary.share()
+			self.stores += 1
+			if not canSteal: self.shared += 1
 			changed = True
 		else:
 			changed = self._secondary[key].merge(secondary)
 
+		self.mergeTime += time.clock()-start
+
 		# Did we discover any new information?
 		if changed and point in self.observers:
 			# Make sure the consumers will be re-evaluated.
@@ -52,6 +67,18 @@ class DataflowEnvironment(object):
 	def clear(self):
 		self._secondary.clear()
 
+	# Returns the memory used by the path information, and the memory that
+	# would be used if every entry had its own copy.
+	def memory(self):
+		seen     = set()
+		used     = 0
+		unshared = 0
+		for secondary in self._secondary.itervalues():
+			total, unseen = secondary.paths.memory(seen)
+			used     += unseen
+			unshared += total
+		return used, unshared
+
 # Processes the queue depth first.
 class Worklist(object):
 	def __init__(self):
@@ -66,13 +93,23 @@ class Worklist(object):
 		key = (constraint, index)
 		if key not in self.dirty:
 			self.dirty.add(key)
-			self.worklist.append(key)
+			self.push(key)
+
+	def push(self, key):
+		self.worklist.append(key)
 
 	def pop(self):
 		key = self.worklist.pop()
 		self.dirty.remove(key)
 		return key
 
+	def clear(self):
+		self.worklist[:] = []
+		self.dirty.clear()
+
+	def __len__(self):
+		return len(self.worklist)
+
 	def step(self, sys, trace=False):
 		# Track statistics
 		self.maxLength = max(len(self.worklist), self.maxLength)
@@ -106,3 +143,21 @@ class Worklist(object):
 				return False
 
 		return True
+
+# Processes the queue in constraint priority order, so a constraint is
+# evaluated after the constraints that feed it, where possible.
+# The highest priority is popped first, ties are broken by insertion order.
+class PriorityWorklist(Worklist):
+	def __init__(self):
+		Worklist.__init__(self)
+		self.uid = 0
+
+	def push(self, key):
+		constraint, index = key
+		heapq.heappush(self.worklist, (-constraint.priority, self.uid, key))
+		self.uid += 1
+
+	def pop(self):
+		priority, uid, key = heapq.heappop(self.worklist)
+		self.dirty.remove(key)
+		return key
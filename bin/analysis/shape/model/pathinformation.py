@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
+
 from util.tvl import *
 
 class EquivalenceClass(object):
@@ -572,14 +574,40 @@ class PathInformation(object):
 
 
 	# Intersects equivilence sets, therefore problematic
+	# The result is new, as the path information may be shared.
 	def inplaceMerge(self, other):
 		lut = {}
 		newRoot, changed = self.root.inplaceIntersect(other.root, lut)
 
 		if changed:
-			self.root = newRoot
+			return PathInformation(newRoot), True
+		else:
+			return self, False
 
-		return self, changed
+	# Returns the size of the equivalence classes reachable from the root,
+	# and the size of those not already in seen.
+	def memory(self, seen):
+		total  = 0
+		unseen = 0
+
+		processed = set()
+		pending   = [self.root]
+		while pending:
+			eq = pending.pop()
+			if eq in processed: continue
+			processed.add(eq)
+
+			size = sys.getsizeof(eq)
+			if eq.attrs is not None:
+				size += sys.getsizeof(eq.attrs)
+				pending.extend(eq.attrs.itervalues())
+
+			total += size
+			if eq not in seen:
+				seen.add(eq)
+				unseen += size
+
+		return total, unseen
 
 	def ageExtended(self, canonical):
 		self.root.ageExtended(canonical)
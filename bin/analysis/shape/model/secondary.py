@@ -39,5 +39,10 @@ class SecondaryInformation(object):
 	def copy(self):
 		return SecondaryInformation(self.paths.copy(), self.externalReferences)
 
+	# Merging replaces the path information rather than modifying it,
+	# so the paths can be shared until then.
+	def share(self):
+		return SecondaryInformation(self.paths, self.externalReferences)
+
 	def forget(self, sys, kill):
 		return sys.canonical.secondary(self.paths.forget(kill), self.externalReferences)
@@ -15,7 +15,6 @@
 import util.canonical
 from language.python import program
 from . import extendedtypes
-from util.monkeypatch import xcollections
 
 class BaseSlotName(util.canonical.CanonicalObject):
 	__slots__ = ()
@@ -123,27 +122,42 @@ class CodeContext(util.canonical.CanonicalObject):
 
 
 class CanonicalObjects(object):
-	def __init__(self):
-		self.opContext   = util.canonical.CanonicalCache(OpContext)
-		self.codeContext = util.canonical.CanonicalCache(CodeContext)
-		self.cache       = xcollections.weakcache()
+	def __init__(self, arena=None):
+		self.arena = arena
+
+		def cache(create):
+			return util.canonical.CanonicalCache(create, arena)
+
+		self.opContext   = cache(OpContext)
+		self.codeContext = cache(CodeContext)
+
+		self._localName    = cache(LocalSlotName)
+		self._existingName = cache(ExistingSlotName)
+		self._fieldName    = cache(FieldSlotName)
+
+		self._externalType = cache(extendedtypes.ExternalObjectType)
+		self._existingType = cache(extendedtypes.ExistingObjectType)
+		self._pathType     = cache(extendedtypes.PathObjectType)
+		self._methodType   = cache(extendedtypes.MethodObjectType)
+		self._contextType  = cache(extendedtypes.ContextObjectType)
+		self._indexedType  = cache(extendedtypes.IndexedObjectType)
 
 		self.index = 0
 
 	def localName(self, code, lcl, context):
-		return self.cache[LocalSlotName(code, lcl, context)]
+		return self._localName(code, lcl, context)
 
 	def existingName(self, code, obj, context):
-		return self.cache[ExistingSlotName(code, obj, context)]
+		return self._existingName(code, obj, context)
 
 	def fieldName(self, type, fname):
-		return self.cache[FieldSlotName(type, fname)]
+		return self._fieldName(type, fname)
 
 	def externalType(self, obj):
-		return self.cache[extendedtypes.ExternalObjectType(obj, None)]
+		return self._externalType(obj, None)
 
 	def existingType(self, obj):
-		return self.cache[extendedtypes.ExistingObjectType(obj, None)]
+		return self._existingType(obj, None)
 
 	def pathType(self, path, obj, op):
 		# HACK reduces the ops by 50%
@@ -151,13 +165,13 @@ class CanonicalObjects(object):
 			op   = None
 			path = None
 
-		return self.cache[extendedtypes.PathObjectType(path, obj, op)]
+		return self._pathType(path, obj, op)
 
 	def methodType(self, func, inst, obj, op):
-		return self.cache[extendedtypes.MethodObjectType(func, inst, obj, op)]
+		return self._methodType(func, inst, obj, op)
 
 	def contextType(self, sig, obj, op):
-		return self.cache[extendedtypes.ContextObjectType(sig, obj, op)]
+		return self._contextType(sig, obj, op)
 
 	def indexedType(self, xtype):
 		# Remove indexed object wrappers
@@ -170,4 +184,4 @@ class CanonicalObjects(object):
 		index = self.index
 		self.index += 1
 
-		return self.cache[extendedtypes.IndexedObjectType(xtype, index)]
+		return self._indexedType(xtype, index)
@@ -13,13 +13,67 @@
 # limitations under the License.
 
 import sys
+import weakref
 from util.monkeypatch import xcollections
 
+import config
+
+# A bounded memo table for binary set operations, keyed by operand identity.
+# Entries hold their operands, so an id cannot be reused while its entry lives.
+# When full, the least recently used half of the table is evicted.
+class BinaryMemo(object):
+	__slots__ = 'size', 'table', 'clock', 'hits', 'misses', 'evictions'
+
+	def __init__(self, size):
+		self.size  = size
+		self.table = {}
+		self.clock = 0
+
+		self.hits      = 0
+		self.misses    = 0
+		self.evictions = 0
+
+	def lookup(self, op, a, b):
+		entry = self.table.get((op, id(a), id(b)))
+		if entry is not None:
+			entry[3] = self.clock
+			self.clock += 1
+			self.hits += 1
+			return entry[2]
+		else:
+			self.misses += 1
+			return None
+
+	def store(self, op, a, b, result):
+		if len(self.table) >= self.size:
+			self.evict()
+
+		self.table[(op, id(a), id(b))] = [a, b, result, self.clock]
+		self.clock += 1
+
+	def evict(self):
+		entries = sorted(self.table.iteritems(), key=lambda item: item[1][3])
+		count = max(len(entries)//2, 1)
+		for key, entry in entries[:count]:
+			del self.table[key]
+		self.evictions += count
+
+	def hitRate(self):
+		return float(self.hits)/max(self.hits+self.misses, 1)
+
+	def memory(self):
+		return sys.getsizeof(self.table)+len(self.table)*sys.getsizeof([None]*4)
+
+
 class CachedSetManager(object):
-	def __init__(self):
+	def __init__(self, memoSize=None):
 		self.cache = xcollections.weakcache()
 		self._emptyset = self.cache[frozenset()]
 
+		if memoSize is None:
+			memoSize = getattr(config, 'setMemoSize', 0)
+		self.memo = BinaryMemo(memoSize) if memoSize > 0 else None
+
 	def coerce(self, values):
 		return self.cache[frozenset(values)]
 
@@ -33,16 +87,39 @@ class CachedSetManager(object):
 			return self.cache[b]
 		elif not b:
 			return self.cache[a]
-		else:
+		elif self.memo is None:
 			return self.cache[a.union(b)]
+		else:
+			# The memo is keyed by identity, so the operands must be interned.
+			# Callers such as SlotNode.initializeType pass temporary sets.
+			a = self.cache[a]
+			b = self.cache[b]
+
+			# Union is commutative, so order the operands.
+			if id(a) > id(b): a, b = b, a
+
+			result = self.memo.lookup('union', a, b)
+			if result is None:
+				result = self.cache[a.union(b)]
+				self.memo.store('union', a, b, result)
+			return result
 
 	def diff(self, a, b):
 		if a is b:
 			return self._emptyset
 		elif not b:
 			return self.cache[a]
-		else:
+		elif self.memo is None:
 			return self.cache[a-b]
+		else:
+			a = self.cache[a]
+			b = self.cache[b]
+
+			result = self.memo.lookup('diff', a, b)
+			if result is None:
+				result = self.cache[a-b]
+				self.memo.store('diff', a, b, result)
+			return result
 
 	def tempDiff(self, a, b):
 		if a is b:
@@ -59,4 +136,137 @@ class CachedSetManager(object):
 		mem = sys.getsizeof(self.cache)
 		for s in self.cache:
 			mem += sys.getsizeof(s)
+		if self.memo is not None:
+			mem += self.memo.memory()
 		return mem
+
+
+# The index of the lowest set bit.  long.bit_length() requires Python 2.7.
+def lowBitIndex(mask):
+	return len(bin(mask & -mask))-3
+
+class Bitset(object):
+	__slots__ = 'mask', 'manager', '_hash', '__weakref__'
+
+	def __init__(self, mask, manager):
+		self.mask    = mask
+		self.manager = manager
+		self._hash   = None
+
+	def __iter__(self):
+		values = self.manager.values
+		mask = self.mask
+		while mask:
+			index = lowBitIndex(mask)
+			yield values[index]
+			mask ^= 1L << index
+
+	def __contains__(self, value):
+		index = self.manager.index.get(value)
+		return index is not None and bool((self.mask >> index) & 1)
+
+	def __len__(self):
+		return bin(self.mask).count('1')
+
+	def __nonzero__(self):
+		return bool(self.mask)
+
+	def __eq__(self, other):
+		if isinstance(other, Bitset) and other.manager is self.manager:
+			return self.mask == other.mask
+		elif isinstance(other, (set, frozenset, Bitset)):
+			return frozenset(self) == frozenset(other)
+		else:
+			return False
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		# Bitsets compare equal to frozensets, so they must hash the same.
+		# Bitsets are interned, so this is only computed once per set.
+		if self._hash is None:
+			self._hash = hash(frozenset(self))
+		return self._hash
+
+	def __repr__(self):
+		return "Bitset(%s)" % ", ".join([repr(value) for value in self])
+
+
+# Numbers each value densely and represents sets as long bitmasks.
+# Sets are interned by mask, so union and diff reduce to an integer
+# operation and a single dictionary probe.
+class BitsetSetManager(object):
+	def __init__(self):
+		self.index  = {}
+		self.values = []
+		self.cache  = weakref.WeakValueDictionary()
+		self._emptyset = self._intern(0)
+
+		# Interning by mask already memoizes union and diff.
+		self.memo = None
+
+	def _intern(self, mask):
+		result = self.cache.get(mask)
+		if result is None:
+			result = Bitset(mask, self)
+			self.cache[mask] = result
+		return result
+
+	def _mask(self, values):
+		if isinstance(values, Bitset):
+			return values.mask
+
+		index = self.index
+		mask = 0
+		for value in values:
+			bit = index.get(value)
+			if bit is None:
+				bit = len(self.values)
+				index[value] = bit
+				self.values.append(value)
+			mask |= 1 << bit
+		return mask
+
+	def coerce(self, values):
+		return self._intern(self._mask(values))
+
+	def empty(self):
+		return self._emptyset
+
+	def inplaceUnion(self, a, b):
+		if a is b:
+			return a
+		else:
+			return self._intern(self._mask(a) | self._mask(b))
+
+	def diff(self, a, b):
+		if a is b:
+			return self._emptyset
+		else:
+			return self._intern(self._mask(a) & ~self._mask(b))
+
+	def tempDiff(self, a, b):
+		if a is b:
+			return self._emptyset
+		else:
+			# Not retained, so it is not interned.
+			return Bitset(self._mask(a) & ~self._mask(b), self)
+
+	def iter(self, s):
+		return iter(s)
+
+	def memory(self):
+		mem = sys.getsizeof(self.cache.data)+sys.getsizeof(self.index)+sys.getsizeof(self.values)
+		for s in self.cache.values():
+			mem += sys.getsizeof(s)+sys.getsizeof(s.mask)
+		return mem
+
+
+setManagers = {'cached':CachedSetManager, 'bitset':BitsetSetManager}
+
+def createSetManager(kind=None):
+	if kind is None:
+		kind = getattr(config, 'setManager', 'cached')
+	assert kind in setManagers, "Unknown set manager %r" % kind
+	return setManagers[kind]()
@@ -19,6 +19,38 @@ from . import annotations
 # HACK for assertions
 from language.python import program
 
+class MergeStats(object):
+	__slots__ = 'regionMerges', 'objectMerges', 'slotMerges', 'swaps', 'compressions', 'maxDepth', 'totalDepth', 'resolves', 'observersDeduped'
+
+	def __init__(self):
+		self.reset()
+
+	def reset(self):
+		self.regionMerges = 0
+		self.objectMerges = 0
+		self.slotMerges   = 0
+
+		# Merges where the larger node was the argument.
+		self.swaps        = 0
+
+		# Forward chains longer than a single hop.
+		self.resolves     = 0
+		self.compressions = 0
+		self.maxDepth     = 0
+		self.totalDepth   = 0
+
+		# Duplicate observers dropped on attach or merge.
+		self.observersDeduped = 0
+
+	def merges(self):
+		return self.regionMerges+self.objectMerges+self.slotMerges
+
+	def averageDepth(self):
+		return float(self.totalDepth)/max(self.resolves, 1)
+
+mergeStats = MergeStats()
+
+
 class MergableNode(object):
 	__slots__ = 'forward'
 
@@ -26,18 +58,52 @@ class MergableNode(object):
 		self.forward = None
 
 	def getForward(self):
-		if self.forward:
-			forward = self.forward.getForward()
-			self.forward = forward
-			return forward
-		else:
+		forward = self.forward
+		if forward is None:
 			return self
 
+		root = forward.forward
+		if root is None:
+			# Common case, a single hop.
+			return forward
+
+		# Find the representative.
+		depth = 2
+		while root.forward is not None:
+			root = root.forward
+			depth += 1
+
+		# Path compression, everything on the chain points directly at the root.
+		node = self
+		while node.forward is not root:
+			node.forward, node = root, node.forward
+
+		mergeStats.resolves     += 1
+		mergeStats.compressions += depth-1
+		mergeStats.totalDepth   += depth
+		if depth > mergeStats.maxDepth: mergeStats.maxDepth = depth
+
+		return root
+
 	def setForward(self, other):
 		assert self.forward is None
 		assert other.forward is None
 		self.forward = other
 
+	def mergeSize(self):
+		return 0
+
+	def mergeOrder(self, other):
+		# Union by size, the larger node survives and the smaller is forwarded.
+		self  = self.getForward()
+		other = other.getForward()
+
+		if self is not other and self.mergeSize() < other.mergeSize():
+			mergeStats.swaps += 1
+			return other, self
+		else:
+			return self, other
+
 	def isObjectContext(self):
 		return False
 
@@ -59,7 +125,7 @@ class StoreGraph(MergableNode):
 		# Root slots, such as locals and references to "existing" objects
 		self.slots      = {}
 		self.regionHint = RegionNode(self)
-		self.setManager = setmanager.CachedSetManager()
+		self.setManager = setmanager.createSetManager()
 		self.extractor  = extractor
 		self.canonical  = canonical
 
@@ -135,6 +201,23 @@ class StoreGraph(MergableNode):
 		for slot in self:
 			slot.removeObservers(processed)
 
+	def allSlots(self):
+		processed = set()
+		stack = [slot.getForward() for slot in self]
+
+		while stack:
+			slot = stack.pop()
+			if slot in processed: continue
+			processed.add(slot)
+			yield slot
+
+			for obj in slot:
+				for field in obj.getForward():
+					stack.append(field.getForward())
+
+	def observerCounts(self):
+		return [len(slot.observers) for slot in self.allSlots()]
+
 class RegionNode(MergableNode):
 	__slots__ = 'objects', 'group', 'weight'
 
@@ -147,11 +230,14 @@ class RegionNode(MergableNode):
 		self.objects = {}
 		self.weight  = 0
 
+	def mergeSize(self):
+		return len(self.objects)
+
 	def merge(self, other):
-		self  = self.getForward()
-		other = other.getForward()
+		self, other = self.mergeOrder(other)
 
 		if self != other:
+			mergeStats.regionMerges += 1
 			other.setForward(self)
 
 			objects = other.objects
@@ -200,11 +286,14 @@ class ObjectNode(MergableNode):
 
 		self.annotation = annotations.emptyObjectAnnotation
 
+	def mergeSize(self):
+		return len(self.slots)
+
 	def merge(self, other):
-		self  = self.getForward()
-		other = other.getForward()
+		self, other = self.mergeOrder(other)
 
 		if self != other:
+			mergeStats.objectMerges += 1
 			other.setForward(self)
 
 			slots = other.slots
@@ -280,15 +369,20 @@ class SlotNode(MergableNode):
 		self.region    = region
 		self.refs      = refs
 		self.null      = True
-		self.observers = []
+
+		# Shared empty tuple until the first observer is attached.
+		self.observers = ()
 
 		self.annotation = annotations.emptyFieldAnnotation
 
+	def mergeSize(self):
+		return len(self.observers)+len(self.refs)
+
 	def merge(self, other):
-		self  = self.getForward()
-		other = other.getForward()
+		self, other = self.mergeOrder(other)
 
 		if self != other:
+			mergeStats.slotMerges += 1
 			other.setForward(self)
 
 			refs = other.refs
@@ -309,7 +403,7 @@ class SlotNode(MergableNode):
 			if sdiff or (not self.null and other.null):
 				self._update(sdiff)
 
-			self.observers.extend(observers)
+			self._mergeObservers(observers)
 
 			if odiff or (self.null and not other.null):
 				for o in observers:
@@ -319,7 +413,8 @@ class SlotNode(MergableNode):
 			self.null |= other.null
 
 		self.region = self.region.getForward()
-		self.object = self.object.getForward()
+		if self.object is not None:
+			self.object = self.object.getForward()
 
 		return self
 
@@ -367,14 +462,36 @@ class SlotNode(MergableNode):
 		for o in self.observers:
 			o.mark()
 
+	def _addObserver(self, constraint):
+		observers = self.observers
+		if not observers:
+			self.observers = [constraint]
+		elif observers[-1] is not constraint:
+			observers.append(constraint)
+		else:
+			# Constraints attach all their slots at once, so a constraint
+			# that reads and writes the same slot is always adjacent.
+			mergeStats.observersDeduped += 1
+
+	def _mergeObservers(self, observers):
+		if not observers:
+			return
+		elif not self.observers:
+			self.observers = observers
+		else:
+			present = set(self.observers)
+			unique  = [o for o in observers if o not in present]
+			mergeStats.observersDeduped += len(observers)-len(unique)
+			self.observers.extend(unique)
+
 	def dependsRead(self, constraint):
 		self = self.getForward()
-		self.observers.append(constraint)
+		self._addObserver(constraint)
 		if self.refs: constraint.mark()
 
 	def dependsWrite(self, constraint):
 		self = self.getForward()
-		self.observers.append(constraint)
+		self._addObserver(constraint)
 		if self.refs: constraint.mark()
 
 	def __iter__(self):
@@ -394,7 +511,7 @@ class SlotNode(MergableNode):
 		self = self.getForward()
 		if self not in processed:
 			processed.add(self)
-			self.observers = []
+			self.observers = ()
 
 			for ref in self:
 				ref.removeObservers(processed)
@@ -14,6 +14,10 @@
 
 from util.python import uniqueSlotName
 import collections
+import util.canonical
+from util.asttools import annotation
+
+import config
 
 class Slots(object):
 	def __init__(self):
@@ -32,10 +36,22 @@ class Slots(object):
 		return uniqueName
 
 class CompilerContext(object):
-	__slots__ = 'console', 'extractor', 'slots', 'stats'
+	__slots__ = 'console', 'extractor', 'slots', 'stats', 'options', 'internArena', 'annotationPool'
 
 	def __init__(self, console):
 		self.console    = console
 		self.extractor  = None
 		self.slots      = Slots()
 		self.stats      = collections.defaultdict(dict)
+
+		# Per-makefile settings, from config(...)
+		self.options    = {}
+
+		# Strong references for canonical objects, released after the compile.
+		if getattr(config, 'internArenas', False):
+			self.internArena = util.canonical.InternArena()
+		else:
+			self.internArena = None
+
+		# Contextual annotations shared by every pass of the compile.
+		self.annotationPool = annotation.AnnotationPool()
@@ -105,6 +105,7 @@ class Makefile(object):
 		with compiler.console.scope("makefile"):
 			compiler.console.output("Processing %s" % self.filename)
 			self.executeFile()
+			compiler.options.update(self.config)
 
 			if not self.interface:
 				compiler.console.output("No entry points, nothing to do.")
@@ -14,6 +14,7 @@
 
 import time
 import util
+import util.io.formatting
 
 #import analysis.ipa
 import analysis.cpa
@@ -106,13 +107,22 @@ def depythonPass(compiler, prgm, opPathLength=0, firstPass=True):
 		#analysis.ipa.evaluate(compiler, prgm)
 		#assert False, "abort"
 
+		start = time.clock()
 		analysis.cpa.evaluate(compiler, prgm, opPathLength, firstPass=firstPass)
+		analysisTime = time.clock()-start
 
 		if firstPass:
 			stats.contextStats(compiler, prgm, 'firstpass' if firstPass else 'secondpass', classOK=firstPass)
 		#errors.abort("testing")
 
+		start = time.clock()
 		codeConditioning(compiler, prgm, firstPass, firstPass)
+		conditioningTime = time.clock()-start
+
+		compiler.console.output("Analysis:     %s" % util.io.formatting.elapsedTime(analysisTime))
+		compiler.console.output("Conditioning: %s" % util.io.formatting.elapsedTime(conditioningTime))
+
+		return analysisTime+conditioningTime
 
 
 def evaluate(compiler, prgm, name):
@@ -120,13 +130,15 @@ def evaluate(compiler, prgm, name):
 		with compiler.console.scope('compile'):
 			try:
 				# First compiler pass
-				depythonPass(compiler, prgm)
+				firstTime = depythonPass(compiler, prgm)
+				compiler.console.output("First pass:  %s" % util.io.formatting.elapsedTime(firstTime))
 
 				if True:
 					# Second compiler pass
 					# Intrinsics can prevent complete exhaustive inlining.
 					# Adding call-path sensitivity compensates.
-					depythonPass(compiler, prgm, 3, firstPass=False)
+					secondTime = depythonPass(compiler, prgm, compiler.options.get('opPathLength', 3), firstPass=False)
+					compiler.console.output("Second pass: %s" % util.io.formatting.elapsedTime(secondTime))
 				else:
 					# HACK rerun lifetime analysis, as inlining causes problems for the function annotations.
 					analysis.lifetimeanalysis.evaluate(compiler, prgm)
@@ -152,6 +164,9 @@ def evaluate(compiler, prgm, name):
 						else:
 							raise
 
+				if compiler.internArena is not None:
+					compiler.internArena.release()
+
 				if config.doThreadCleanup:
 					if threading.activeCount() > 1:
 						with compiler.console.scope('threading cleanup'):
@@ -15,8 +15,14 @@
 from . import interface
 
 class Program(object):
-	__slots__ = 'interface', 'storeGraph', 'entryPoints', 'liveCode', 'stats'
+	__slots__ = 'interface', 'storeGraph', 'entryPoints', 'liveCode', 'imageSnapshot', 'pointsTo', 'stats'
 
 	def __init__(self):
 		self.interface = interface.InterfaceDeclaration()
 		self.stats = None
+
+		# The initial heap image, replayed rather than rebuilt by later passes.
+		self.imageSnapshot = None
+
+		# Demand driven points-to queries for the last CPA solve.
+		self.pointsTo = None
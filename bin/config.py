@@ -34,6 +34,18 @@ useXTypes = True
 useControlSensitivity = True
 useCPA = True
 
+# Set representation used by the pointer analyses, 'cached' or 'bitset'
+setManager = 'cached'
+
+# Hold canonical objects in strong per-compile arenas, rather than weak tables
+internArenas = False
+
+# Index the CPA read/modify/allocate/invoke logs by canonical uid, rather than hashing
+indexedTables = False
+
+# Number of memoized union/diff results kept by the 'cached' set manager, 0 disables
+setMemoSize = 4096
+
 if True:
 	testOnly = [
 		('tests', 'test_full'),
@@ -0,0 +1,139 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Microbenchmark for the canonical object interning tables.
+#
+# python internbench.py record <makefile> <trace>
+#	Compiles the makefile, recording every canonical lookup.
+# python internbench.py replay [<trace>]
+#	Replays a recorded trace, or a synthetic one, through the old weakcache
+#	interning and through CanonicalCache with and without an arena.
+
+from __future__ import absolute_import
+
+import sys
+import time
+import random
+import cPickle as pickle
+
+import scriptsetup
+
+root = scriptsetup.scriptRoot(__file__)
+scriptsetup.libraryDirectory(root, '..', 'lib')
+
+import util.canonical
+from util.monkeypatch import xcollections
+
+
+def record(makefile, tracefile):
+	from application.makefile import Makefile
+
+	log = []
+	util.canonical.traceLog = log
+	try:
+		Makefile(makefile).pystreamCompile()
+	finally:
+		util.canonical.traceLog = None
+
+	# Objects are not picklable, so record their identity instead.
+	uids = {}
+	trace = []
+	for kind, args in log:
+		trace.append((kind, tuple([uids.setdefault(id(arg), len(uids)) for arg in args])))
+
+	f = open(tracefile, 'wb')
+	pickle.dump(trace, f, pickle.HIGHEST_PROTOCOL)
+	f.close()
+
+	print "Recorded %d lookups, %d distinct arguments." % (len(trace), len(uids))
+
+
+def syntheticTrace(count=200000, distinct=20000):
+	# CPA lookups are heavily skewed towards a few hot names.
+	random.seed(0)
+	trace = []
+	for i in xrange(count):
+		uid = int(random.paretovariate(1.2)) % distinct
+		trace.append(('Synthetic', (uid, uid//7, uid%3)))
+	return trace
+
+
+def makeKinds(trace):
+	kinds = {}
+	for kind, args in trace:
+		if kind not in kinds:
+			kinds[kind] = type(kind, (util.canonical.CanonicalObject,), {'__slots__':()})
+	return kinds
+
+def makeArgs(trace):
+	tokens = {}
+	replay = []
+	for kind, args in trace:
+		replay.append((kind, tuple([tokens.setdefault(uid, util.canonical.Sentinel(str(uid))) for uid in args])))
+	return replay
+
+
+def replayWeakcache(trace, kinds):
+	caches = dict([(kind, xcollections.weakcache()) for kind in kinds])
+	live = []
+	for kind, args in trace:
+		live.append(caches[kind][kinds[kind](*args)])
+	return live
+
+def replayCanonicalCache(trace, kinds, arena=None):
+	caches = dict([(kind, util.canonical.CanonicalCache(cls, arena)) for kind, cls in kinds.iteritems()])
+	live = []
+	for kind, args in trace:
+		live.append(caches[kind](*args))
+	return live
+
+
+def timeit(name, f, *args):
+	start = time.clock()
+	live = f(*args)
+	end = time.clock()
+	print "%-20s %8.1f ms  (%d distinct)" % (name, (end-start)*1000.0, len(set([id(obj) for obj in live])))
+	return end-start
+
+def replay(tracefile=None):
+	if tracefile is None:
+		trace = syntheticTrace()
+	else:
+		f = open(tracefile, 'rb')
+		trace = pickle.load(f)
+		f.close()
+
+	kinds = makeKinds(trace)
+	trace = makeArgs(trace)
+
+	print "%d lookups" % len(trace)
+	base = timeit('weakcache', replayWeakcache, trace, kinds)
+	weak = timeit('canonical cache', replayCanonicalCache, trace, kinds)
+
+	arena = util.canonical.InternArena()
+	strong = timeit('canonical arena', replayCanonicalCache, trace, kinds, arena)
+	arena.release()
+
+	print
+	print "Speedup %.2fx (weak), %.2fx (arena)" % (base/max(weak, 1e-9), base/max(strong, 1e-9))
+
+
+if __name__ == '__main__':
+	if len(sys.argv) == 4 and sys.argv[1] == 'record':
+		record(sys.argv[2], sys.argv[3])
+	elif len(sys.argv) in (2, 3) and sys.argv[1] == 'replay':
+		replay(*sys.argv[2:])
+	else:
+		print "usage: %s record <makefile> <trace> | replay [<trace>]" % sys.argv[0]
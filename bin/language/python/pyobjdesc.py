@@ -0,0 +1,44 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Descriptions of Python objects that refer to them by name, so they resolve
+# to the same objects when unpickled in a later compile.
+
+import types
+
+from language.python import program
+
+class Uncacheable(Exception):
+	pass
+
+namedTypes = (type, types.ClassType, types.FunctionType, types.BuiltinFunctionType)
+
+def pyObjDesc(pyobj):
+	if isinstance(pyobj, namedTypes) or program.isConstant(pyobj):
+		# Pickled by name or by value.
+		return ('pyobj', pyobj)
+
+	# Slot wrappers and the like cannot be pickled, but can be found by name.
+	cls  = getattr(pyobj, '__objclass__', None)
+	name = getattr(pyobj, '__name__', None)
+	if isinstance(cls, type) and cls.__dict__.get(name) is pyobj:
+		return ('member', cls, name)
+
+	raise Uncacheable, "cannot describe %r" % (pyobj,)
+
+def descPyObj(desc):
+	if desc[0] == 'pyobj':
+		return desc[1]
+	else:
+		return desc[1].__dict__[desc[2]]
@@ -65,11 +65,12 @@ def makeCallRewrite(extractor):
 
 
 class FoldRewrite(TypeDispatcher):
-	def __init__(self, extractor, storeGraph, code):
+	def __init__(self, extractor, storeGraph, code, pointsTo=None):
 		TypeDispatcher.__init__(self)
 		self.extractor = extractor
 		self.storeGraph = storeGraph
 		self.code = code
+		self.pointsTo = pointsTo
 
 		self.created = set()
 
@@ -103,6 +104,9 @@ class FoldRewrite(TypeDispatcher):
 			refs = ref.annotation.references
 			if refs is not None:
 				return refs[0]
+			elif self.pointsTo is not None:
+				# Not annotated, ask the solver directly.
+				return self.pointsTo.refs(self.code, ref)
 			else:
 				return () # HACK?
 		else:
@@ -493,12 +497,14 @@ def evaluateCode(compiler, prgm, node):
 
 	if prgm is None:
 		storeGraph = None
+		pointsTo   = None
 	else:
 		storeGraph = prgm.storeGraph
+		pointsTo   = prgm.pointsTo
 
 	if node.isStandardCode():
 		analyze  = FoldAnalysis()
-		rewrite  = FoldRewrite(compiler.extractor, storeGraph, node)
+		rewrite  = FoldRewrite(compiler.extractor, storeGraph, node, pointsTo)
 		rewriteS = FoldTraverse(rewrite, node)
 
 		traverse = ForwardFlowTraverse(constMeet, analyze, rewriteS)
@@ -511,7 +517,7 @@ def evaluateCode(compiler, prgm, node):
 		t(node)
 	else:
 		# HACK bypass dataflow analysis, as there's no real "flow"
-		rewrite  = FoldRewrite(compiler.extractor, storeGraph, node)
+		rewrite  = FoldRewrite(compiler.extractor, storeGraph, node, pointsTo)
 		rewriteS = FoldTraverse(rewrite, node)
 		node.replaceChildren(rewriteS)
 
@@ -0,0 +1,60 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+
+from analysis.cpa import annotationworkers
+
+class Item(object):
+	pass
+
+class MockDataflow(object):
+	def __init__(self):
+		self.items = [Item() for i in range(30)]
+
+		self.invokeLUT = {('code', 'op'):{'context':set(self.items[:10])}}
+		self.lclLUT    = {('code', 'lcl'):{'context':self.items[10:20]}}
+		self.opReads   = {'cop':set(self.items[20:])}
+		self.opModifies  = {}
+		self.opAllocates = {}
+
+	def cdata(self, start, stop):
+		return [tuple(self.items[start:stop]), ()]
+
+	def collectCodeData(self, code, contexts):
+		if code is None:
+			# Items created by a worker cannot be translated.
+			code = 0
+			lclData = [[(Item(),)]]
+		else:
+			lclData = [self.cdata(code+10, code+12)]
+
+		codeRMA = (self.cdata(code, code+3), self.cdata(0, 0), self.cdata(20, 22))
+		opData  = [(self.cdata(code+1, code+4), self.cdata(0, 1), self.cdata(2, 3), self.cdata(4, 5))]
+		return codeRMA, opData, lclData
+
+class TestAnnotationWorkers(unittest.TestCase):
+	def testCollect(self):
+		dataflow = MockDataflow()
+		codes = [(i, ()) for i in range(8)]+[(None, ())]
+
+		results = annotationworkers.collect(dataflow, codes, 2)
+		self.assertEqual(len(results), len(codes))
+
+		for (code, contexts), result in zip(codes[:-1], results):
+			codeRMA, opData, lclData = dataflow.collectCodeData(code, contexts)
+			self.assertEqual(result, (list(codeRMA), [list(op) for op in opData], lclData))
+
+		self.assertEqual(results[-1], None)
@@ -0,0 +1,202 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+
+from application.context import CompilerContext
+from analysis.storegraph import storegraph, canonicalobjects
+from analysis.cpa import InterproceduralDataflow
+from language.python import ast, program
+
+class MockExtractor(object):
+	def __init__(self):
+		self.cache = {}
+
+	def getObject(self, pyobj):
+		key = (type(pyobj), pyobj)
+		result = self.cache.get(key)
+		if result is None:
+			result = program.Object(pyobj)
+			self.cache[key] = result
+		return result
+
+	def ensureLoaded(self, obj):
+		if not hasattr(obj, 'type'):
+			obj.type = self.getObject(type(obj.pyobj))
+
+class TestDataflowBase(unittest.TestCase):
+	def setUp(self):
+		self.compiler  = CompilerContext(None)
+		self.extractor = MockExtractor()
+		self.compiler.extractor = self.extractor
+		self.canonical = canonicalobjects.CanonicalObjects()
+		self.graph = storegraph.StoreGraph(self.extractor, self.canonical)
+		self.dataflow = self.createDataflow()
+
+	def createDataflow(self):
+		return InterproceduralDataflow(self.compiler, self.graph, 0, False)
+
+	def local(self, name):
+		code    = self.dataflow.externalFunction
+		context = self.dataflow.externalFunctionContext
+		return self.graph.root(self.canonical.localName(code, ast.Local(name), context))
+
+	def xtype(self, pyobj):
+		return self.canonical.existingType(self.extractor.getObject(pyobj))
+
+
+class TestCycleCollapsing(TestDataflowBase):
+	def testCopyCycle(self):
+		a = self.local('a')
+		b = self.local('b')
+
+		self.dataflow.createAssign(a, b)
+		self.dataflow.createAssign(b, a)
+		a.initializeType(self.xtype(1))
+		self.dataflow.process()
+
+		self.assert_(a.getForward() is b.getForward())
+		self.assertEqual(a.getForward().refs, frozenset([self.xtype(1)]))
+		self.assertEqual((self.dataflow.cyclesCollapsed, self.dataflow.slotsCollapsed), (1, 1))
+
+	def testFieldsNotCollapsed(self):
+		a = self.local('a')
+		# Fields of existing objects would be read from the Python object.
+		xtype = self.canonical.pathType(None, self.extractor.getObject(1), None)
+		obj = a.initializeType(xtype)
+		name = self.canonical.fieldName('Attribute', self.extractor.getObject('f'))
+		field = obj.field(name, self.graph.regionHint)
+
+		self.dataflow.createAssign(a, field)
+		self.dataflow.createAssign(field, a)
+		self.dataflow.process()
+
+		self.assert_(a.getForward() is a)
+		self.assert_(field.getForward() is field)
+		self.assertEqual(field.refs, a.refs)
+		self.assertEqual(self.dataflow.cyclesCollapsed, 0)
+
+	def testDisabled(self):
+		self.dataflow = InterproceduralDataflow(self.compiler, self.graph, 0, False, collapseCycles=False)
+
+		a = self.local('a')
+		b = self.local('b')
+
+		self.dataflow.createAssign(a, b)
+		self.dataflow.createAssign(b, a)
+		a.initializeType(self.xtype(1))
+		self.dataflow.process()
+
+		self.assert_(a.getForward() is not b.getForward())
+		self.assertEqual(a.refs, b.refs)
+		self.assertEqual(self.dataflow.cyclesCollapsed, 0)
+
+
+from analysis.cpa.constraints import CachedConstraint, AbstractCallConstraint
+
+class MockSlot(object):
+	def __init__(self, *refs):
+		self.refs = frozenset(refs)
+
+	def add(self, *refs):
+		self.refs = self.refs.union(refs)
+
+	def getForward(self):
+		return self
+
+	def dependsRead(self, constraint):
+		pass
+
+class MockSystem(object):
+	def __init__(self, deltaPropagation):
+		self.deltaPropagation = deltaPropagation
+		self.combinationsEvaluated = 0
+		self.combinationsSkipped   = 0
+
+	def constraint(self, constraint):
+		pass
+
+class RecordingConstraint(CachedConstraint):
+	def __init__(self, sys, *slots):
+		self.log = []
+		CachedConstraint.__init__(self, sys, *slots)
+
+	def concreteUpdate(self, *args):
+		self.log.append(args)
+
+class RecordingCall(AbstractCallConstraint):
+	def __init__(self, sys, selfarg, vargs):
+		self.vargs = vargs
+		self.log = []
+		CachedConstraint.__init__(self, sys, selfarg, vargs, None)
+
+	def concreteUpdate(self, *args):
+		self.log.append(args)
+
+class TestDeltaPropagation(unittest.TestCase):
+	def run3(self, deltaPropagation):
+		a, b, c = MockSlot(1), MockSlot('x'), MockSlot(None)
+		sys = MockSystem(deltaPropagation)
+		constraint = RecordingConstraint(sys, a, b, c)
+
+		constraint.update()
+		a.add(2)
+		b.add('y')
+		constraint.update()
+		c.add(3)
+		constraint.update()
+
+		return constraint, sys
+
+	def testSameCombinations(self):
+		delta, dsys = self.run3(True)
+		full,  fsys = self.run3(False)
+
+		self.assertEqual(set(delta.log), set(full.log))
+		self.assertEqual(len(set(delta.log)), 8)
+
+		# Each combination is only evaluated once.
+		self.assertEqual(len(delta.log), 8)
+		self.assertEqual(dsys.combinationsEvaluated, 8)
+		self.assert_(dsys.combinationsSkipped > 0)
+
+		# Full enumeration re-evaluates the old combinations.
+		self.assertEqual(len(full.log), 1+4+8)
+
+	def testVArgsFallback(self):
+		expr, vargs = MockSlot('f'), MockSlot('t0')
+		sys = MockSystem(True)
+		constraint = RecordingCall(sys, expr, vargs)
+		self.failIf(constraint.incremental())
+
+		constraint.update()
+		vargs.add('t1')
+		constraint.update()
+
+		# The vargs lengths are not observed, so every combination is examined again.
+		self.assertEqual(constraint.log, [('f', 't0', None), ('f', 't0', None), ('f', 't1', None)])
+		self.assertEqual(sys.combinationsEvaluated, 0)
+
+	def testNoVArgs(self):
+		expr = MockSlot('f')
+		sys = MockSystem(True)
+		constraint = RecordingCall(sys, expr, None)
+		self.assert_(constraint.incremental())
+
+		constraint.update()
+		expr.add('g')
+		constraint.update()
+
+		self.assertEqual(sorted(constraint.log), [('f', None, None), ('g', None, None)])
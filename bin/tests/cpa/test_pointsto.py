@@ -0,0 +1,63 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+import collections
+
+from language.python import ast
+from analysis.cpa import pointsto
+
+class TestPointsToQuery(unittest.TestCase):
+	def setUp(self):
+		self.code = 'code'
+		self.lcl  = ast.Local('a')
+		self.op   = 'op'
+
+		lclLUT = collections.defaultdict(lambda: collections.defaultdict(set))
+		lclLUT[(self.code, self.lcl)]['c0'] = set([1, 2])
+		lclLUT[(self.code, self.lcl)]['c1'] = set([2, 3])
+
+		invokeLUT = collections.defaultdict(lambda: collections.defaultdict(set))
+		invokeLUT[(self.code, self.op)]['c0'].add(('callee', 'c2'))
+
+		self.lclLUT = lclLUT
+		self.query = pointsto.PointsToQuery(None, lclLUT, invokeLUT)
+
+	def testRefs(self):
+		self.assertEqual(self.query.refs(self.code, self.lcl, 'c0'), (1, 2))
+		self.assertEqual(self.query.refs(self.code, self.lcl), (1, 2, 3))
+		self.assertEqual(self.query.refs(self.code, self.lcl, 'missing'), ())
+
+	def testUnknown(self):
+		self.assertEqual(self.query.refs(self.code, ast.Local('b')), ())
+		self.assertEqual(len(self.lclLUT), 1)
+
+	def testInvokes(self):
+		self.assertEqual(self.query.invokes(self.code, self.op), (('callee', 'c2'),))
+		self.assertEqual(self.query.invokes(self.code, 'other'), ())
+
+	def testCache(self):
+		a = self.query.refs(self.code, self.lcl)
+		self.assert_(self.query.refs(self.code, self.lcl) is a)
+		self.assertEqual((self.query.hits, self.query.misses), (1, 1))
+
+		self.query.invalidate()
+		self.query.refs(self.code, self.lcl)
+		self.assertEqual(self.query.misses, 2)
+
+	def testOrigin(self):
+		clone = ast.Local('a')
+		query = pointsto.PointsToQuery(None, self.lclLUT, {}, {'clone':self.code, clone:self.lcl})
+		self.assertEqual(query.refs('clone', clone, 'c1'), (2, 3))
@@ -0,0 +1,92 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import absolute_import
+import unittest
+import gc
+
+from analysis.cpa import worklist
+
+class MockSlot(object):
+	def __init__(self):
+		self.observers = []
+
+	def getForward(self):
+		return self
+
+class MockConstraint(object):
+	def __init__(self, name, reads=(), writes=()):
+		self.name    = name
+		self._writes = writes
+		for slot in reads:
+			slot.observers.append(self)
+
+	def writes(self):
+		return self._writes
+
+	def __repr__(self):
+		return self.name
+
+class TestWorklist(unittest.TestCase):
+	def drain(self, wl):
+		order = []
+		while wl:
+			constraint = wl.pop()
+			wl.fired(constraint)
+			order.append(constraint.name)
+		return order
+
+	def testFIFO(self):
+		wl = worklist.createWorklist('fifo', None)
+		for name in 'abc':
+			wl.append(MockConstraint(name))
+		self.assertEqual(self.drain(wl), ['a', 'b', 'c'])
+
+	def testLeastRecentlyFired(self):
+		wl = worklist.createWorklist('lrf', None)
+		a, b, c = [MockConstraint(name) for name in 'abc']
+
+		for constraint in (a, b):
+			wl.append(constraint)
+		self.assertEqual(self.drain(wl), ['a', 'b'])
+
+		# Never fired comes first, then the least recently fired.
+		for constraint in (b, a, c):
+			wl.append(constraint)
+		self.assertEqual(self.drain(wl), ['c', 'a', 'b'])
+
+	def testRanked(self):
+		# c reads what b writes, b reads what a writes.
+		ab, bc = MockSlot(), MockSlot()
+		c = MockConstraint('c', reads=(bc,))
+		b = MockConstraint('b', reads=(ab,), writes=(bc,))
+		a = MockConstraint('a', writes=(ab,))
+
+		wl = worklist.RankedWorklist(None, threshold=0)
+		for constraint in (c, b, a):
+			wl.append(constraint)
+
+		# Producers fire before consumers.
+		self.assertEqual(self.drain(wl), ['a', 'b', 'c'])
+		self.assertEqual(wl.rerankings, 1)
+
+	def testWeakBookkeeping(self):
+		for name in ('lrf', 'ranked'):
+			wl = worklist.createWorklist(name, None)
+			wl.append(MockConstraint('a'))
+			self.drain(wl)
+			gc.collect()
+
+			table = wl.lastFired if name == 'lrf' else wl.rank
+			self.assertEqual(len(table), 0)
@@ -0,0 +1,190 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from . base import TestIPABase
+
+class MockCall(object):
+	def __init__(self, log, dirty=None):
+		self.log   = log
+		self.dirty = dirty
+
+	def resolve(self, context):
+		self.log.append(context)
+
+		# Resolving may dirty calls in another context.
+		if self.dirty is not None:
+			self.dirty.dirtyCall(MockCall(self.log))
+
+class TestCallGraphUpdate(TestIPABase):
+	def setUp(self):
+		TestIPABase.setUp(self)
+		self.contexts = [self.makeContext() for i in range(4)]
+		self.log = []
+
+	def testClean(self):
+		self.failIf(self.analysis.updateCallGraph())
+		self.assertEqual(self.analysis.callGraphRounds[-1][:2], (0, 0))
+
+	def testOnlyDirty(self):
+		a, b, c, d = self.contexts
+		b.dirtyCall(MockCall(self.log))
+		b.dirtyFCall(MockCall(self.log))
+
+		self.assert_(self.analysis.updateCallGraph())
+		self.assertEqual(self.log, [b, b])
+		self.assertEqual(self.analysis.callGraphRounds[-1][:2], (1, 1))
+		self.failIf(b.callgraphDirty)
+
+	def testCascade(self):
+		a, b, c, d = self.contexts
+		a.dirtyCall(MockCall(self.log, d))
+
+		self.analysis.updateCallGraph()
+		self.assertEqual(self.log, [a, d])
+		self.assertEqual(self.analysis.dirtyContexts, [])
+
+		rounds, visited, updated, elapsed = self.analysis.callGraphStats()
+		self.assertEqual((rounds, visited, updated), (1, 2, 2))
+
+
+from analysis.ipa.model.invocation import Invocation
+
+class TestBottomUp(TestIPABase):
+	def setUp(self):
+		TestIPABase.setUp(self)
+		self.a, self.b, self.c = [self.makeContext() for i in range(3)]
+
+		Invocation(self.analysis.root, 'entry', self.a)
+		Invocation(self.a, 'op0', self.b)
+		Invocation(self.b, 'op1', self.c)
+
+	def components(self):
+		# StronglyConnectedComponents is not a generator, so the order can be inspected.
+		order = []
+		original = self.analysis.componentBottomUp
+		def log(component):
+			order.append(frozenset(component))
+			original(component)
+		self.analysis.componentBottomUp = log
+		self.analysis.bottomUp()
+		return order
+
+	def testCalleesFirst(self):
+		order = self.components()
+		self.assertEqual(order[:3], [frozenset([self.c]), frozenset([self.b]), frozenset([self.a])])
+		self.assertEqual(self.analysis.recursiveComponents, 0)
+
+	def testRecursion(self):
+		Invocation(self.c, 'op2', self.a)
+
+		order = self.components()
+		self.assertEqual(order[0], frozenset([self.a, self.b, self.c]))
+		self.assertEqual(self.analysis.recursiveComponents, 1)
+
+	def testDeepChain(self):
+		prev = self.c
+		for i in range(5000):
+			context = self.makeContext()
+			Invocation(prev, i, context)
+			prev = context
+
+		order = self.components()
+		self.assertEqual(order[0], frozenset([prev]))
+
+	def testSummaryVersion(self):
+		from analysis.ipa import summary
+
+		s = self.a.summary
+		s.dirty = True
+		self.assert_(summary.update(self.a))
+		self.assertEqual(s.version, 1)
+
+		# Recomputing an identical summary does not change the version.
+		s.dirty = True
+		self.failIf(summary.update(self.a))
+		self.assertEqual(s.version, 1)
+
+	def testWaves(self):
+		# a and d are independent siblings under the root.
+		d = self.makeContext()
+		Invocation(self.analysis.root, 'entry2', d)
+
+		waves = self.analysis.componentSchedule(self.analysis.callGraph())
+		waves = [set([frozenset(component) for component in wave]) for wave in waves]
+
+		self.assertEqual(waves[0], set([frozenset([self.c]), frozenset([d])]))
+		self.assertEqual(waves[1:], [set([frozenset([self.b])]), set([frozenset([self.a])]), set([frozenset([self.analysis.root])])])
+
+		self.analysis.bottomUp()
+		self.assertEqual(self.analysis.bottomUpStats(), (4, 2, 1.25))
+
+
+from language.python import ast
+from analysis.ipa.constraints import qualifiers
+
+class OrderedComponent(dict):
+	# Fixes the order the members of a component are processed in.
+	def __init__(self, order, callees):
+		dict.__init__(self, callees)
+		self.order = order
+
+	def __iter__(self):
+		return iter(self.order)
+
+class TestRecursiveSummaries(TestIPABase):
+	def setUp(self):
+		TestIPABase.setUp(self)
+		self.a, self.b, self.c = [self.makeContext() for i in range(3)]
+		for context in (self.a, self.b, self.c):
+			context.returns.append(context.local(ast.Local('return')))
+
+		# c returns a global object, a and b return what their callee returns.
+		self.obj = self.const('obj', qualifiers.GLBL)
+		self.c.returns[0].updateSingleValue(self.obj)
+		self.c.summary.dirty = True
+
+		Invocation(self.analysis.root, 'entry', self.a)
+		self.call(self.a, 'op0', self.b)
+		self.call(self.b, 'op1', self.c)
+
+	def call(self, src, op, dst):
+		invoke = Invocation(src, op, dst)
+		invoke.up(dst.returns[0], src.returns[0])
+		return invoke
+
+	def assertSummaries(self):
+		for context in (self.a, self.b, self.c):
+			self.assertEqual(context.summary.slotObjs[context.returns[0]], [self.obj])
+
+	def testChain(self):
+		self.analysis.bottomUp()
+		self.assertSummaries()
+
+	def testBackEdge(self):
+		# The back edge adds nothing, but puts every context in one component.
+		self.call(self.c, 'op2', self.a)
+		self.analysis.bottomUp()
+		self.assertSummaries()
+
+	def componentBottomUp(self, order):
+		self.call(self.c, 'op2', self.a)
+		callees = {self.a:[self.b], self.b:[self.c], self.c:[self.a]}
+
+		self.analysis.componentBottomUp(OrderedComponent(order, callees))
+		self.assertSummaries()
+
+	def testCallersFirst(self):
+		self.componentBottomUp([self.a, self.b, self.c])
+
+	def testCalleesFirst(self):
+		self.componentBottomUp([self.c, self.b, self.a])
@@ -510,3 +510,33 @@ class TestStoreAssignConstraint(TestConstraintBase):
 			(self.bxRef, None, (self.bxExpr,)),
 			]
 		self.checkTransfer(argument, results)
+
+
+class MockConstraint(object):
+	def __init__(self, priority, log):
+		self.priority = priority
+		self.log      = log
+
+	def update(self, sys, index):
+		self.log.append((self.priority, index))
+
+class TestWorklist(unittest.TestCase):
+	def order(self, worklist):
+		log = []
+		low, high = MockConstraint(1, log), MockConstraint(2, log)
+
+		worklist.addDirty(low, 'a')
+		worklist.addDirty(high, 'a')
+		worklist.addDirty(low, 'b')
+		worklist.addDirty(high, 'a') # Already dirty
+
+		self.assertEqual(len(worklist), 3)
+		self.assert_(worklist.process(None))
+		self.assertEqual(worklist.steps, 3)
+		return log
+
+	def testLIFO(self):
+		self.assertEqual(self.order(analysis.shape.dataflow.Worklist()), [(1, 'b'), (2, 'a'), (1, 'a')])
+
+	def testPriority(self):
+		self.assertEqual(self.order(analysis.shape.dataflow.PriorityWorklist()), [(2, 'a'), (1, 'a'), (1, 'b')])
@@ -18,6 +18,7 @@ import unittest
 
 import analysis.shape.model.canonical as canonical
 import analysis.shape.model.pathinformation as pathinformation
+import analysis.shape.dataflow as dataflow
 
 from util.tvl import *
 
@@ -162,6 +163,36 @@ class TestPathInformation(TestPathInformationBase):
 		self.assert_(not info3.mustAlias(self.a, self.an))
 		self.assert_(info3.mustAlias(self.a, self.ann))
 
+		# The merged information is new, the originals are unchanged.
+		self.assert_(info3 is not info1)
+		self.assert_(info1.mustAlias(self.a, self.an))
+
+	def testSharedSecondary(self):
+		env = dataflow.DataflowEnvironment()
+
+		info = pathinformation.PathInformation()
+		info = info.unionHitMiss((self.an,), ())
+		shared = self.canonical.secondary(info, False)
+
+		env.merge(None, 'p', None, 0, shared)
+		env.merge(None, 'q', None, 0, shared)
+		self.assertEqual((env.shared, env.stores), (2, 2))
+
+		p = env.secondary('p', None, 0)
+		q = env.secondary('q', None, 0)
+		self.assert_(p.paths is q.paths)
+
+		used, unshared = env.memory()
+		self.assertEqual(used*2, unshared)
+
+		# Merging into one entry does not affect the other.
+		other = pathinformation.PathInformation()
+		other = other.unionHitMiss((), (self.an,))
+		env.merge(None, 'p', None, 0, self.canonical.secondary(other, False))
+
+		self.assertEqual(p.paths.hit(self.an), TVLMaybe)
+		self.assertEqual(q.paths.hit(self.an), TVLTrue)
+
 
 class PathInfoBase(unittest.TestCase):
 	def makeLocalExpr(self, lcl):
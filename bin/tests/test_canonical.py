@@ -243,3 +243,111 @@ class TestCanonicalSetTree(unittest.TestCase):
 
 		result = self.setManager.simplify(domain, tree, default)
 		self.assert_(result is expected, (result, expected))
+
+	def testPersistentCache(self):
+		a = self.setManager.tree(self.c0, (self.setManager.leaf((1,)), self.setManager.leaf((2,))))
+		b = self.setManager.tree(self.c1, (self.setManager.leaf((3,)), a))
+
+		union = self.setManager.union
+		first = union(a, b)
+		misses = union.cache.misses
+
+		# The second computation is answered from the table.
+		self.assert_(union(a, b) is first)
+		self.assert_(union(b, a) is first)
+		self.assertEqual(union.cache.misses, misses)
+		self.assertEqual(union.cache.hits, 2)
+
+		hits, total, evictions = self.setManager.cacheStats()
+		self.assert_(hits >= 2)
+
+	def testCacheEviction(self):
+		table = canonicaltree.ComputedTable(2)
+		for i in range(3):
+			table.store(i, i)
+		table.age()
+		self.assertEqual(len(table.current), 0)
+
+		# Used entries move back into the current generation.
+		self.assertEqual(table.lookup(0), 0)
+		table.store(3, 3)
+		table.store(4, 4)
+		table.age()
+		self.assertEqual(table.evictions, 2)
+		self.assertEqual(table.lookup(0), 0)
+		self.assert_(table.lookup(1) is canonicaltree.noValue)
+
+	def testFlattenShared(self):
+		one = self.setManager.leaf((1,))
+		two = self.setManager.leaf((2,))
+		shared = self.setManager.tree(self.c0, (one, two))
+		tree = self.setManager.tree(self.c2, (shared, shared, one))
+
+		self.assertEqual(self.setManager.flatten(tree), set([1, 2]))
+
+		# Each of the four nodes is only visited once.
+		self.assertEqual(self.setManager._flatten.cacheMiss, 4)
+		self.assertEqual(self.setManager._flatten.cacheHit, 2)
+
+	def testNodeCollection(self):
+		one = self.setManager.leaf((1,))
+		two = self.setManager.leaf((2,))
+		live = self.setManager.liveNodes()
+
+		tree = self.setManager.union(self.setManager.tree(self.c0, (one, two)), one)
+		self.assert_(self.setManager.liveNodes() > live)
+
+		# Only the computed table references the intermediate nodes.
+		del tree
+		self.setManager.collect()
+		self.setManager.collect()
+		self.assertEqual(self.setManager.liveNodes(), live)
+
+		live, peak, created, collections = self.setManager.nodeStats()
+		self.assert_(peak > live)
+		self.assertEqual(collections, 2)
+
+
+class TestConditionReorder(unittest.TestCase):
+	def setUp(self):
+		self.conditions = canonicaltree.ConditionManager()
+		self.manager    = canonicaltree.BoolManager(self.conditions)
+
+	def evaluate(self, tree, conds):
+		results = []
+		for bits in range(1<<len(conds)):
+			d = dict([(cond, (bits>>i)&1) for i, cond in enumerate(conds)])
+			result = self.manager.restrict(tree, d)
+			self.assert_(result.leaf(), result)
+			results.append(result.value)
+		return results
+
+	def testSift(self):
+		# (a0 & b0) | (a1 & b1) | (a2 & b2) is exponential in the creation order.
+		a = [self.conditions.condition(('a', i), [0, 1]) for i in range(3)]
+		b = [self.conditions.condition(('b', i), [0, 1]) for i in range(3)]
+
+		tree = self.manager.false
+		for ai, bi in zip(a, b):
+			tree = self.manager.or_(tree, self.manager.and_(ai.mask[1], bi.mask[1]))
+
+		conds = a+b
+		expected = self.evaluate(tree, conds)
+		mask = a[0].mask[1]
+
+		before, after = self.conditions.reorder([self.manager])
+		self.assert_(after < before, (before, after))
+
+		# The outstanding references represent the same functions.
+		self.assertEqual(self.evaluate(tree, conds), expected)
+		self.assertEqual(self.evaluate(mask, conds), [bits&1 == 1 for bits in range(64)])
+
+		# The uids are still a permutation, and the trees are still ordered.
+		self.assertEqual(sorted([cond.uid for cond in conds]), range(6))
+		for node in self.manager.trees:
+			for branch in node.branches:
+				self.assert_(node.cond > branch.cond)
+
+		# Operations are still canonical.
+		self.assert_(self.manager.or_(tree, tree) is tree)
+		self.assert_(self.manager.and_(tree, self.manager.true) is tree)
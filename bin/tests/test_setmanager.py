@@ -0,0 +1,103 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+
+from analysis.storegraph import setmanager
+
+class TestCachedSetManager(unittest.TestCase):
+	def createManager(self):
+		return setmanager.CachedSetManager()
+
+	def setUp(self):
+		self.manager = self.createManager()
+
+	def assertContents(self, s, values):
+		self.assertEqual(frozenset(s), frozenset(values))
+		self.assertEqual(len(s), len(values))
+
+	def testCoerce(self):
+		a = self.manager.coerce(['a', 'b'])
+		b = self.manager.coerce(('b', 'a'))
+		self.assert_(a is b)
+		self.assertContents(a, ('a', 'b'))
+		self.assert_('a' in a)
+		self.failIf('c' in a)
+
+	def testEmpty(self):
+		e = self.manager.empty()
+		self.failIf(e)
+		self.assert_(self.manager.coerce(()) is e)
+
+	def testUnion(self):
+		a = self.manager.coerce((1, 2))
+		b = self.manager.coerce((2, 3))
+		c = self.manager.coerce((1, 2, 3))
+		self.assert_(self.manager.inplaceUnion(a, b) is c)
+		self.assert_(self.manager.inplaceUnion(a, frozenset((3,))) is c)
+
+	def testDiff(self):
+		a = self.manager.coerce((1, 2))
+		b = self.manager.coerce((2, 3))
+		self.assert_(self.manager.diff(a, b) is self.manager.coerce((1,)))
+		self.assert_(self.manager.diff(a, a) is self.manager.empty())
+		self.assertContents(self.manager.tempDiff(b, a), (3,))
+
+	def testMemory(self):
+		self.manager.coerce((1, 2))
+		self.assert_(self.manager.memory() > 0)
+
+
+class TestBitsetSetManager(TestCachedSetManager):
+	def createManager(self):
+		return setmanager.BitsetSetManager()
+
+
+class TestSetMemo(unittest.TestCase):
+	def setUp(self):
+		self.manager = setmanager.CachedSetManager(memoSize=4)
+
+	def testHits(self):
+		a = self.manager.coerce((1, 2))
+		b = self.manager.coerce((2, 3))
+
+		u = self.manager.inplaceUnion(a, b)
+		self.assert_(self.manager.inplaceUnion(b, a) is u)
+		self.assert_(self.manager.diff(a, b) is self.manager.diff(a, b))
+
+		memo = self.manager.memo
+		self.assertEqual(memo.hits, 2)
+		self.assertEqual(memo.misses, 2)
+
+	def testTemporaries(self):
+		a = self.manager.coerce((1, 2))
+
+		u = self.manager.inplaceUnion(a, frozenset((3,)))
+		self.assert_(self.manager.inplaceUnion(a, frozenset((3,))) is u)
+
+		memo = self.manager.memo
+		self.assertEqual(memo.hits, 1)
+		self.assertEqual(len(memo.table), 1)
+
+	def testEviction(self):
+		sets = [self.manager.coerce((i, i+1)) for i in range(6)]
+		for s in sets[1:]:
+			self.manager.inplaceUnion(sets[0], s)
+
+		memo = self.manager.memo
+		self.assert_(len(memo.table) <= memo.size)
+		self.assert_(memo.evictions > 0)
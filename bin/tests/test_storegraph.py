@@ -0,0 +1,106 @@
+# Copyright 2011 Nicholas Bray
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from __future__ import absolute_import
+
+import unittest
+
+from analysis.storegraph import storegraph
+
+class SizedNode(storegraph.MergableNode):
+	__slots__ = 'size'
+
+	def __init__(self, size=0):
+		storegraph.MergableNode.__init__(self)
+		self.size = size
+
+	def mergeSize(self):
+		return self.size
+
+class TestMergableNode(unittest.TestCase):
+	def setUp(self):
+		storegraph.mergeStats.reset()
+
+	def chain(self, length):
+		nodes = [SizedNode() for i in range(length)]
+		for a, b in zip(nodes, nodes[1:]):
+			a.setForward(b)
+		return nodes
+
+	def testUnforwarded(self):
+		node = SizedNode()
+		self.assert_(node.getForward() is node)
+
+	def testSingleHop(self):
+		a, b = self.chain(2)
+		self.assert_(a.getForward() is b)
+		self.assertEqual(storegraph.mergeStats.resolves, 0)
+
+	def testPathCompression(self):
+		nodes = self.chain(5000)
+		root = nodes[-1]
+
+		# Deep chains must not exhaust the stack.
+		self.assert_(nodes[0].getForward() is root)
+
+		for node in nodes[:-1]:
+			self.assert_(node.forward is root)
+
+		stats = storegraph.mergeStats
+		self.assertEqual(stats.resolves, 1)
+		self.assertEqual(stats.maxDepth, 4999)
+		self.assertEqual(stats.compressions, 4998)
+
+	def testMergeOrder(self):
+		small = SizedNode(1)
+		large = SizedNode(10)
+
+		self.assertEqual(small.mergeOrder(large), (large, small))
+		self.assertEqual(large.mergeOrder(small), (large, small))
+		self.assertEqual(storegraph.mergeStats.swaps, 1)
+
+	def testMergeOrderForwarded(self):
+		a, b = self.chain(2)
+		self.assertEqual(a.mergeOrder(b), (b, b))
+
+class TestSlotObservers(unittest.TestCase):
+	def setUp(self):
+		storegraph.mergeStats.reset()
+		self.slot = storegraph.SlotNode(None, 'slot', None, frozenset())
+
+	def testEmptyShared(self):
+		other = storegraph.SlotNode(None, 'other', None, frozenset())
+		self.assert_(self.slot.observers is other.observers)
+
+	def testAddObserver(self):
+		a, b = object(), object()
+		self.slot._addObserver(a)
+		self.slot._addObserver(a)
+		self.slot._addObserver(b)
+		self.assertEqual(self.slot.observers, [a, b])
+		self.assertEqual(storegraph.mergeStats.observersDeduped, 1)
+
+	def testMergeObservers(self):
+		a, b, c = object(), object(), object()
+		self.slot._addObserver(a)
+		self.slot._addObserver(b)
+		self.slot._mergeObservers([b, c, a])
+		self.assertEqual(self.slot.observers, [a, b, c])
+		self.assertEqual(storegraph.mergeStats.observersDeduped, 2)
+
+	def testMergeIntoEmpty(self):
+		observers = [object()]
+		self.slot._mergeObservers(observers)
+		self.assert_(self.slot.observers is observers)
@@ -41,6 +41,102 @@ class TestTypeDisbatch(unittest.TestCase):
 		self.assertEqual(foo(1.0),   'default')
 
 
+import util.canonical
+
+class Pair(util.canonical.CanonicalObject):
+	__slots__ = ()
+
+class TestCanonicalCache(unittest.TestCase):
+	def testIntern(self):
+		cache = util.canonical.CanonicalCache(Pair)
+		a = cache(1, 2)
+		self.assert_(cache(1, 2) is a)
+		self.failIf(cache(2, 1) is a)
+
+	def testRelease(self):
+		cache = util.canonical.CanonicalCache(Pair)
+		a = cache(1, 2)
+		self.assertEqual(len(cache.table), 1)
+		del a
+		self.assertEqual(len(cache.table), 0)
+
+	def testArena(self):
+		arena = util.canonical.InternArena()
+		cache = util.canonical.CanonicalCache(Pair, arena)
+		a = cache(1, 2)
+		self.assert_(cache(1, 2) is a)
+		self.assertEqual(len(arena), 1)
+		arena.release()
+		self.assertEqual(len(cache.table), 0)
+
+	def testUID(self):
+		cache = util.canonical.CanonicalCache(Pair)
+		a = cache(1, 2)
+		b = cache(2, 1)
+		self.assertEqual((a.uid, b.uid), (0, 1))
+		self.assertEqual(cache(1, 2).uid, 0)
+
+	def checkTable(self, table):
+		cache = util.canonical.CanonicalCache(Pair)
+		a = cache(1, 2)
+		b = cache(2, 1)
+
+		table[b].add('b')
+		self.assert_(b in table)
+		self.failIf(a in table)
+		self.assertEqual(table.get(a, ()), ())
+		self.assertEqual(table[b], set(['b']))
+		self.assertEqual(list(table.iteritems()), [(b, set(['b']))])
+		self.assertEqual(len(table), 1)
+
+	def testTable(self):
+		self.checkTable(util.canonical.canonicalTable(set))
+
+	def testIndexedTable(self):
+		self.checkTable(util.canonical.canonicalTable(set, indexed=True))
+
+
+from util.asttools import annotation
+
+class TestAnnotationPool(unittest.TestCase):
+	def setUp(self):
+		self.pool = annotation.AnnotationPool()
+
+	def testContextual(self):
+		a = self.pool.contextual([(1, 2), (2, 3)], 'code')
+		self.assertEqual(a, annotation.makeContextualAnnotation([(1, 2), (2, 3)]))
+		self.assert_(self.pool.contextual([(1, 2), (2, 3)], 'other') is a)
+		self.assertEqual((self.pool.lookups, self.pool.hits), (2, 1))
+
+	def testSharedSets(self):
+		a = self.pool.contextual([(1,), (2,)], 'code')
+		b = self.pool.contextual([(2,), (1,)], 'code')
+		self.failIf(a is b)
+		self.assert_(a.context[0] is b.context[1])
+		self.assert_(a.merged is b.merged)
+
+	def testIntern(self):
+		a = annotation.makeContextualAnnotation([(1,), ()])
+		self.assert_(self.pool.intern(a, 'code') is self.pool.contextual([(1,), ()], 'code'))
+		self.assertEqual(self.pool.intern(None, 'code'), None)
+
+	def testCollect(self):
+		a = self.pool.contextual([(1,)], 'live')
+		self.pool.contextual([(1,)], 'dead')
+		self.pool.contextual([(2,)], 'dead')
+		self.assertEqual(len(self.pool), 2)
+
+		self.assertEqual(self.pool.collect(set(['live'])), 1)
+		self.assertEqual(len(self.pool), 1)
+		self.assertEqual(self.pool.evicted, 1)
+		self.assert_(self.pool.contextual([(1,)], 'live') is a)
+		self.failIf((2,) in self.pool.sets)
+
+		self.pool.release('live')
+		self.assertEqual(len(self.pool), 0)
+		self.assertEqual(len(self.pool.sets), 0)
+
+
 import util.python.calling
 from util.tvl import *
 class TestCallingUtility(unittest.TestCase):
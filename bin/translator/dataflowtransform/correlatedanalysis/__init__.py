@@ -46,6 +46,9 @@ class GenericOpFunction(TypeDispatcher):
 		self.outputlut   = {} # maps (name, index) -> position in outputValues
 		self.outputs     = [] # list of (node, index, position) to output.
 
+		# The concrete function depends on the op, so results cannot be shared between ops.
+		self.func.cache.clear()
+
 		self.g         = g
 		self.op        = g.op
 		self.analysis  = analysis
@@ -365,6 +368,10 @@ class DataflowIOAnalysis(TypeDispatcher):
 
 		self.opfunc = GenericOpFunction(self.set)
 
+		# Reorder the conditions once the trees grow past this many nodes.
+		self.reorderThreshold = compiler.options.get('conditionReorderThreshold')
+		self.reorderLog = []
+
 		# (node, index) -> slot unique?
 		# (object unique is necessary but not sufficient)
 		self.slotUnique = {}
@@ -523,6 +530,22 @@ class DataflowIOAnalysis(TypeDispatcher):
 			for op in self.order:
 				self(op)
 
+				# Between ops no intermediate trees are in flight.
+				self.bool.safePoint()
+				self.set.safePoint()
+				self.maybeReorder()
+
+	def maybeReorder(self):
+		if self.reorderThreshold is None: return
+
+		managers = (self.bool, self.set)
+		if sum([manager.treeNodes() for manager in managers]) >= self.reorderThreshold:
+			before, after = self.cond.reorder(managers)
+			self.reorderLog.append((before, after))
+
+			# Do not reorder again until the trees have doubled.
+			self.reorderThreshold = max(self.reorderThreshold, after*2)
+
 	def opMask(self, op):
 		if hasattr(op, 'predicate'):
 			p = op.predicate
@@ -647,6 +670,17 @@ def evaluateDataflow(compiler, prgm, dataflow):
 	dioa = DataflowIOAnalysis(compiler, prgm, dataflow, order)
 	dioa.process()
 
+	for name, manager in (('bool', dioa.bool), ('set', dioa.set)):
+		hits, misses, evictions = manager.cacheStats()
+		total = max(hits+misses, 1)
+		compiler.console.output("%s tree cache %d/%d hits (%.1f%%), %d evicted" % (name, hits, hits+misses, hits*100.0/total, evictions))
+
+		live, peak, created, collections = manager.nodeStats()
+		compiler.console.output("%s tree nodes %d live, %d peak, %d created, %d collections" % (name, live, peak, created, collections))
+
+	for before, after in dioa.reorderLog:
+		compiler.console.output("reordered conditions, %d -> %d tree nodes" % (before, after))
+
 	# HACK store on dioa
 	# TODO do not return dioa, just the dataflow
 	dioa.flat = flattendataflow.evaluateDataflow(compiler, prgm, dataflow, order, dioa)
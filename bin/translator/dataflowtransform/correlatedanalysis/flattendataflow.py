@@ -304,6 +304,16 @@ class DataflowFlattener(TypeDispatcher):
 			result = value
 		return result
 
+	# The mappings go through the flattener's tables, which connect modifies,
+	# so results cannot be kept between uses.
+	def mapFields(self, data):
+		self.fieldMapper.cache.clear()
+		return self.fieldMapper(data)
+
+	def mapObjects(self, data):
+		self.objMapper.cache.clear()
+		return self.objMapper(data)
+
 	def makeCorrelatedAnnotation(self, data):
 		return annotations.CorrelatedAnnotation(self.dioa.set.flatten(data), data)
 
@@ -312,7 +322,7 @@ class DataflowFlattener(TypeDispatcher):
 
 		# Predicates will have binary values, so skip remapping them
 		if not slot[0].isPredicate():
-			values = self.objMapper(values)
+			values = self.mapObjects(values)
 
 		values = self.makeCorrelatedAnnotation(values)
 		unique = self.dioa.isUniqueSlot(*slot)
@@ -322,9 +332,9 @@ class DataflowFlattener(TypeDispatcher):
 		result.annotation = annotation
 
 	def translateOpAnnotations(self, g, result):
-		reads     = self.makeCorrelatedAnnotation(self.fieldMapper(self.dioa.opReads[g]))
-		modifies  = self.makeCorrelatedAnnotation(self.fieldMapper(self.dioa.opModifies[g]))
-		allocates = self.makeCorrelatedAnnotation(self.objMapper(self.dioa.opAllocates[g]))
+		reads     = self.makeCorrelatedAnnotation(self.mapFields(self.dioa.opReads[g]))
+		modifies  = self.makeCorrelatedAnnotation(self.mapFields(self.dioa.opModifies[g]))
+		allocates = self.makeCorrelatedAnnotation(self.mapObjects(self.dioa.opAllocates[g]))
 
 		mask      = self.dioa.opMask(g)
 
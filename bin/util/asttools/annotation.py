@@ -14,8 +14,9 @@
 
 import util.canonical
 import collections
+import sys
 
-__all__ = ['noMod', 'remapContextual', 'makeContextualAnnotation', 'annotationSet', 'mergeContextualAnnotation', 'ContextualAnnotation']
+__all__ = ['noMod', 'remapContextual', 'makeContextualAnnotation', 'annotationSet', 'mergeContextualAnnotation', 'ContextualAnnotation', 'AnnotationPool']
 
 noMod = util.canonical.Sentinel('<no mod>')
 
@@ -45,6 +46,109 @@ def mergeContextualAnnotation(a, b):
 	else:
 		return makeContextualAnnotation([mergeAnnotationSet(ca, cb) for ca, cb in zip(a.context, b.context)])
 
+# Interns contextual annotations for the whole compile.
+# Annotation sets are given dense IDs, so a contextual annotation is looked up
+# by a tuple of small integers rather than by hashing nested tuples.
+# Entries are reference counted by the code that uses them, and are evicted
+# once that code is no longer live.
+class AnnotationPool(object):
+	def __init__(self):
+		self.sets       = {} # data -> [id, data, refs]
+		self.entries    = {} # context ids -> [annotation, refs, set entries]
+		self.owners     = {} # code -> context ids
+		self.uid        = 0
+
+		self.lookups  = 0
+		self.hits     = 0
+		self.evicted  = 0
+
+	def _set(self, data):
+		entry = self.sets.get(data)
+		if entry is None:
+			entry = [self.uid, data, 0]
+			self.uid += 1
+			self.sets[data] = entry
+		return entry
+
+	def contextual(self, cdata, owner):
+		self.lookups += 1
+
+		setEntries = [self._set(data) for data in cdata]
+		key = tuple([entry[0] for entry in setEntries])
+
+		entry = self.entries.get(key)
+
+		if entry is None:
+			merged = set()
+			for data in cdata: merged.update(data)
+			mergedEntry = self._set(annotationSet(merged))
+			setEntries.append(mergedEntry)
+
+			for setEntry in setEntries:
+				setEntry[2] += 1
+
+			annotation = ContextualAnnotation(mergedEntry[1], tuple([setEntry[1] for setEntry in setEntries[:-1]]))
+			entry = [annotation, 0, setEntries]
+			self.entries[key] = entry
+		else:
+			self.hits += 1
+
+		keys = self.owners.get(owner)
+		if keys is None:
+			keys = set()
+			self.owners[owner] = keys
+
+		if key not in keys:
+			keys.add(key)
+			entry[1] += 1
+
+		return entry[0]
+
+	def intern(self, annotation, owner):
+		if annotation is None:
+			return None
+		return self.contextual(annotation.context, owner)
+
+	def _release(self, key):
+		entry = self.entries[key]
+		entry[1] -= 1
+
+		if entry[1] == 0:
+			del self.entries[key]
+			self.evicted += 1
+
+			for setEntry in entry[2]:
+				setEntry[2] -= 1
+				if setEntry[2] == 0:
+					del self.sets[setEntry[1]]
+
+	def release(self, owner):
+		keys = self.owners.pop(owner, ())
+		for key in keys:
+			self._release(key)
+
+	def collect(self, live):
+		# Evict the annotations only used by dead code.
+		dead = [owner for owner in self.owners.iterkeys() if owner not in live]
+		for owner in dead:
+			self.release(owner)
+		return len(dead)
+
+	def hitRate(self):
+		return float(self.hits)/max(self.lookups, 1)
+
+	def memory(self):
+		size = 0
+		for entry in self.sets.itervalues():
+			size += sys.getsizeof(entry[1])
+		for key, entry in self.entries.iteritems():
+			size += sys.getsizeof(key)+sys.getsizeof(entry[0])+sys.getsizeof(entry[0].context)
+		return size
+
+	def __len__(self):
+		return len(self.entries)
+
+
 def remapContextual(cdata, remap, translator=None):
 	if cdata is None: return None
 
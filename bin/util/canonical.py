@@ -12,8 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from weakref import ref
 from util.monkeypatch import xcollections
 
+# If set to a list, every canonical lookup is appended to it as (kind, args).
+# Used to record traces for benchmarking the interning tables.
+traceLog = None
+
 class Sentinel(object):
 	__slots__ = 'name', '__weakref__'
 
@@ -26,7 +31,8 @@ class Sentinel(object):
 
 # An object that is equivalent if its "canonical values" are equivalent.
 class CanonicalObject(object):
-	__slots__ = 'canonical', 'hash', '__weakref__'
+	# uid is a dense, per-kind index assigned when the object is interned.
+	__slots__ = 'canonical', 'hash', 'uid', '__weakref__'
 
 	def __init__(self, *args):
 		self.setCanonical(*args)
@@ -46,10 +52,148 @@ class CanonicalObject(object):
 		return "%s(%s)" % (type(self).__name__, canonicalStr)
 
 
+# Holds strong references to everything interned by the caches registered
+# with it, so lookups skip the weakref dereference.  Releasing the arena
+# drops the tables, for instance at the end of a compile.
+class InternArena(object):
+	def __init__(self):
+		self.caches = []
+
+	def register(self, cache):
+		self.caches.append(cache)
+
+	def release(self):
+		for cache in self.caches:
+			cache.clear()
+		self.caches = []
+
+	def __len__(self):
+		return sum([len(cache.table) for cache in self.caches])
+
+
 class CanonicalCache(object):
-	def __init__(self, create):
+	__slots__ = 'create', 'cache', 'table', 'strong', 'count', '__weakref__'
+
+	def __init__(self, create, arena=None):
 		self.create = create
+		self.count  = 0
+
+		# Canonical objects are interned by equality...
 		self.cache  = xcollections.weakcache()
 
+		# ...but looked up by their arguments, so a hit allocates nothing.
+		self.table  = {}
+		self.strong = arena is not None
+		if arena is not None: arena.register(self)
+
 	def __call__(self, *args):
-		return self.cache[self.create(*args)]
+		if traceLog is not None:
+			traceLog.append((self.create.__name__, args))
+
+		entry = self.table.get(args)
+		if entry is not None:
+			if self.strong: return entry
+
+			result = entry()
+			if result is not None: return result
+
+		candidate = self.create(*args)
+		result = self.cache[candidate]
+
+		if result is candidate:
+			result.uid = self.count
+			self.count += 1
+
+		if self.strong:
+			self.table[args] = result
+		else:
+			def remove(wr, table=self.table, args=args):
+				if table.get(args) is wr:
+					del table[args]
+			self.table[args] = ref(result, remove)
+
+		return result
+
+	def clear(self):
+		self.table.clear()
+
+
+# Tables keyed by interned canonical objects.
+# Missing entries are created with the factory, like a defaultdict.
+class CanonicalTable(object):
+	__slots__ = 'factory', 'data'
+
+	def __init__(self, factory):
+		self.factory = factory
+		self.data    = {}
+
+	def __getitem__(self, key):
+		value = self.data.get(key)
+		if value is None:
+			value = self.factory()
+			self.data[key] = value
+		return value
+
+	def get(self, key, default=None):
+		return self.data.get(key, default)
+
+	def __contains__(self, key):
+		return key in self.data
+
+	def iteritems(self):
+		return self.data.iteritems()
+
+	def __len__(self):
+		return len(self.data)
+
+
+# Indexes by uid rather than hashing the key.
+class IndexedCanonicalTable(object):
+	__slots__ = 'factory', 'keys', 'values', 'size'
+
+	def __init__(self, factory):
+		self.factory = factory
+		self.keys    = []
+		self.values  = []
+		self.size    = 0
+
+	def __getitem__(self, key):
+		uid = key.uid
+		values = self.values
+		if uid >= len(values):
+			grow = uid+1-len(values)
+			values.extend([None]*grow)
+			self.keys.extend([None]*grow)
+
+		value = values[uid]
+		if value is None:
+			value = self.factory()
+			values[uid] = value
+			self.keys[uid] = key
+			self.size += 1
+		return value
+
+	def get(self, key, default=None):
+		uid = key.uid
+		if uid < len(self.values):
+			value = self.values[uid]
+			if value is not None:
+				return value
+		return default
+
+	def __contains__(self, key):
+		return self.get(key) is not None
+
+	def iteritems(self):
+		for key, value in zip(self.keys, self.values):
+			if value is not None:
+				yield key, value
+
+	def __len__(self):
+		return self.size
+
+def canonicalTable(factory, indexed=False):
+	if indexed:
+		return IndexedCanonicalTable(factory)
+	else:
+		return CanonicalTable(factory)